@@ -1,9 +1,24 @@
-from flask import Flask, request, jsonify, send_file, Response
+from flask import Flask, request, jsonify, send_from_directory, Response
 from flask_cors import CORS
-from services.translation_service import TranslationService
+from services.translation_memory import get_translation_memory
+from services.checkpoints import get_checkpoint_store
+from services.job_queue import JobQueue, QueueFullError
+from services.translation_worker import TranslationWorker
+from services.cell_filter import SKIP_RULES
+from services.provider_router import get_router
+from services.glossary import Glossary, GlossaryError
+from services.formats import SUPPORTED_EXTENSIONS, output_mimetype
+from services.job_history import get_job_history
+from services import metrics
+from services.event_broker import EventBroker
+from services.storage import (
+    MAX_UPLOAD_BYTES, OUTPUT_PREFIX, SpooledUploadRequest, clean_uploads, discard_upload, save_upload
+)
+from werkzeug.exceptions import NotFound
 from werkzeug.utils import secure_filename
 import threading
-import queue
+import multiprocessing
+import logging
 import json
 import time
 import os
@@ -12,6 +27,13 @@ import uuid
 app = Flask(__name__)
 CORS(app)
 
+# Under gunicorn, app and background (job queue) errors go to its error log
+gunicorn_logger = logging.getLogger('gunicorn.error')
+if gunicorn_logger.handlers:
+    for logger in (app.logger, logging.getLogger('services')):
+        logger.handlers = gunicorn_logger.handlers
+        logger.setLevel(gunicorn_logger.level)
+
 # Configure upload folder
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
@@ -19,39 +41,66 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# Uploads are streamed into a spool file in the upload folder and capped in size
+SpooledUploadRequest.upload_folder = UPLOAD_FOLDER
+app.request_class = SpooledUploadRequest
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
+
+# Behind nginx/Apache, let the proxy send files (X-Sendfile) instead of the worker
+app.config['USE_X_SENDFILE'] = os.getenv('USE_X_SENDFILE') == '1'
+
 # Store translation progress
 translation_progress = {}
-translation_queues = {}
+translation_finished = {}
 
-def send_translation_progress(translation_id):
-    while True:
-        try:
-            # Get progress from queue
-            progress_data = translation_queues[translation_id].get(timeout=1)
-            
-            # Check if translation is complete
-            if progress_data.get('complete'):
-                yield f"data: {json.dumps(progress_data)}\n\n"
-                break
-                
-            # Send progress update
-            yield f"data: {json.dumps(progress_data)}\n\n"
-            
-        except queue.Empty:
-            # Send heartbeat to keep connection alive
-            yield f"data: {json.dumps({'heartbeat': True})}\n\n"
-            
-        except Exception as e:
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
-            break
+# Progress events fanned out to every SSE subscriber of a job
+event_broker = EventBroker()
+
+# Finished jobs stay in memory this long so late SSE clients still get the final event
+JOB_RETENTION_SECONDS = int(os.getenv('JOB_RETENTION_SECONDS', 600))
+
+# Finished job rows are kept in the job table this long
+JOB_HISTORY_SECONDS = int(os.getenv('JOB_HISTORY_SECONDS', 7 * 24 * 3600))
+
+JOBS_ACTIVE = metrics.gauge('translation_jobs_active', 'Translation jobs currently running')
+JOBS_FINISHED = metrics.counter('translation_jobs_total', 'Finished translation jobs by status', ('status',))
+QUEUE_DEPTH = metrics.gauge('translation_queue_depth', 'Translation jobs waiting for a worker')
+SSE_CONNECTIONS = metrics.gauge('sse_connections', 'Open progress event streams')
+
+def send_translation_progress(translation_id, last_event_id=None):
+    SSE_CONNECTIONS.labels().inc()
+    try:
+        for event_id, data in event_broker.subscribe(translation_id, last_event_id):
+            if event_id is None:
+                # Comment line keeps the connection alive without waking the client
+                yield ": heartbeat\n\n"
+            else:
+                yield f"id: {event_id}\ndata: {json.dumps(data)}\n\n"
+    finally:
+        SSE_CONNECTIONS.labels().dec()
 
 def progress_callback(translation_id):
     def callback(data):
-        if translation_id in translation_queues:
-            translation_queues[translation_id].put(data)
+        event_broker.publish(translation_id, data)
     return callback
 
-def process_translation(translation_id, filepath, target_language, provider, model):
+def final_progress(job):
+    """
+    Final progress event of a completed or failed job, built from its row
+    """
+    if job['status'] == 'completed':
+        return {
+            'progress': 100,
+            'message': 'Translation completed!',
+            'complete': True,
+            'translated_file': job['result']
+        }
+    return {'error': job['error'], 'complete': True}
+
+def process_translation(job):
+    translation_id = job['id']
+    filepath = job['filepath']
+    JOBS_ACTIVE.labels().inc()
     try:
         # Update progress
         translation_progress[translation_id] = {
@@ -62,39 +111,95 @@ def process_translation(translation_id, filepath, target_language, provider, mod
             'translated_file': None
         }
 
-        # Initialize translation service
-        translation_service = TranslationService()
-        translation_service.set_progress_callback(progress_callback(translation_id))
-        
-        # Translate the file
-        translated_filename = translation_service.translate_excel(
-            file_path=filepath,
-            target_language=target_language,
-            provider=provider,
-            model=model
+        # Translate the file in the worker process, checkpointing progress under the job ID
+        translated_filename = translation_worker.run(
+            translation_id,
+            dict(file_path=filepath, job_id=translation_id, **job['params']),
+            on_event=progress_callback(translation_id)
         )
 
         # Update final status
-        translation_queues[translation_id].put({
+        translation_progress[translation_id] = {
             'progress': 100,
             'message': 'Translation completed!',
             'complete': True,
             'translated_file': translated_filename
-        })
+        }
+
+        # Clean up original files and checkpoints after successful translation
+        remove_job_files(job)
+        get_checkpoint_store().clear(translation_id)
 
-        # Clean up original file after successful translation
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        JOBS_FINISHED.labels(status='completed').inc()
+        return translated_filename
 
     except Exception as e:
         # Update error status
-        translation_queues[translation_id].put({
+        translation_progress[translation_id] = {
             'error': str(e),
             'complete': True
-        })
-        # Clean up on error
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        }
+        # The upload and checkpoints are kept so the job can be resumed;
+        # the janitor removes them once the job leaves the history
+        JOBS_FINISHED.labels(status='failed').inc()
+        raise
+
+    finally:
+        JOBS_ACTIVE.labels().dec()
+        translation_finished[translation_id] = time.time()
+
+def publish_final_progress(job):
+    # Called by the queue after the job row is updated, so clients that
+    # poll /translate/<id> on the final event already see the new status
+    event_broker.publish(job['id'], final_progress(job))
+
+def remove_job_files(job):
+    """
+    Delete a job's input file and the earlier version it was diffed against, if any
+    """
+    for path in [job['filepath']] + (job['params'].get('previous_files') or []):
+        if os.path.exists(path):
+            os.remove(path)
+
+def collect_finished_jobs():
+    """
+    Drop in-memory state of jobs that finished more than JOB_RETENTION_SECONDS ago
+    """
+    cutoff = time.time() - JOB_RETENTION_SECONDS
+    for translation_id, finished_at in list(translation_finished.items()):
+        if finished_at < cutoff:
+            translation_finished.pop(translation_id, None)
+            event_broker.discard(translation_id)
+            translation_progress.pop(translation_id, None)
+
+def run_janitor():
+    while True:
+        time.sleep(60)
+        try:
+            collect_finished_jobs()
+            for job in job_queue.purge(JOB_HISTORY_SECONDS):
+                if job['status'] == 'failed':
+                    remove_job_files(job)
+                get_checkpoint_store().clear(job['id'])
+            get_job_history().purge()
+            clean_uploads(UPLOAD_FOLDER)
+        except Exception:
+            app.logger.exception("Job cleanup failed")
+
+# Workbooks are loaded, translated and saved in a separate process, shared by all jobs
+translation_worker = TranslationWorker()
+
+# Bounded worker pool backed by a persistent job table
+job_queue = JobQueue(
+    process_translation, db_path=os.path.join(UPLOAD_FOLDER, 'jobs.db'), on_finish=publish_final_progress
+)
+
+# Worker processes are spawned and may re-import this module; only the
+# main process runs translation workers
+if multiprocessing.parent_process() is None:
+    translation_worker.start()
+    job_queue.start()
+    threading.Thread(target=run_janitor, name="job-janitor", daemon=True).start()
 
 @app.route('/translate', methods=['POST'])
 def translate():
@@ -105,12 +210,60 @@ def translate():
     if file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
 
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        return jsonify({'error': 'Invalid file type. Please upload an Excel file'}), 400
+    if not file.filename.lower().endswith(SUPPORTED_EXTENSIONS):
+        return jsonify({'error': 'Invalid file type. Please upload an Excel, CSV or TSV file'}), 400
 
-    target_language = request.form.get('target_language', 'es')
+    # Several target languages can be sent as repeated `target_languages`
+    # fields or comma separated; the job then returns one zip with a file per language
+    target_languages = [
+        language.strip()
+        for value in request.form.getlist('target_languages') or [request.form.get('target_language', 'es')]
+        for language in value.split(',') if language.strip()
+    ]
+    if not target_languages:
+        return jsonify({'error': 'No target language provided'}), 400
+    target_language = target_languages[0] if len(target_languages) == 1 else target_languages
     provider = request.form.get('provider', 'groq')
     model = request.form.get('model')
+    batch_size = request.form.get('batch_size', type=int)
+    token_budget = request.form.get('token_budget', type=int)
+
+    # Comma separated cell filter rules, e.g. "number,date,email"; empty disables skipping
+    skip_rules = request.form.get('skip_rules')
+    if skip_rules is not None:
+        skip_rules = [rule.strip() for rule in skip_rules.split(',') if rule.strip()]
+        unknown = [rule for rule in skip_rules if rule not in SKIP_RULES]
+        if unknown:
+            return jsonify({'error': f"Unknown skip rules: {', '.join(unknown)}"}), 400
+
+    # Per-job term map as JSON, e.g. {"Invoice": "Factura"} or {"Order": {"es": "Pedido", "fr": "Commande"}}
+    glossary = request.form.get('glossary')
+    try:
+        Glossary.parse(glossary)
+    except GlossaryError as e:
+        return jsonify({'error': str(e)}), 400
+    glossary = json.loads(glossary) if glossary else None
+
+    # Batch strings per column with the header in the prompt; unset uses COLUMN_CONTEXT
+    column_context = request.form.get('column_context')
+    if column_context is not None:
+        column_context = column_context.lower() in ('1', 'true', 'yes')
+
+    # A new version of an earlier file reuses the translations of unchanged strings,
+    # given the earlier job or the earlier source file with its translated output
+    previous_job_id = request.form.get('previous_job_id') or None
+    previous_uploads = [request.files.get('previous_source'), request.files.get('previous_output')]
+    if any(previous_uploads):
+        if previous_job_id or not all(previous_uploads):
+            return jsonify({'error': 'Send either previous_job_id or both previous_source and previous_output'}), 400
+        if not all(upload.filename.lower().endswith(SUPPORTED_EXTENSIONS) for upload in previous_uploads):
+            return jsonify({'error': 'Invalid previous file type'}), 400
+        if len(target_languages) > 1:
+            return jsonify({'error': 'previous_source and previous_output can only be used with a single target language'}), 400
+    else:
+        previous_uploads = None
+    if previous_job_id and not get_job_history().languages(previous_job_id):
+        return jsonify({'error': f'No translations kept for previous job {previous_job_id}'}), 400
     
     try:
         # Generate a unique ID for this translation
@@ -119,23 +272,51 @@ def translate():
         # Save the file temporarily
         filename = secure_filename(file.filename)
         temp_filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{translation_id}_{filename}")
-        file.save(temp_filepath)
+        save_upload(file, temp_filepath)
+        previous_files = None
+        if previous_uploads:
+            previous_files = [
+                os.path.join(app.config['UPLOAD_FOLDER'], f"{translation_id}_{kind}_{secure_filename(upload.filename)}")
+                for kind, upload in zip(('previous_source', 'previous_output'), previous_uploads)
+            ]
+            for upload, path in zip(previous_uploads, previous_files):
+                save_upload(upload, path)
 
-        # Create progress queue
-        translation_queues[translation_id] = queue.Queue()
-        
-        # Start translation in a background thread
-        thread = threading.Thread(
-            target=process_translation,
-            args=(translation_id, temp_filepath, target_language, provider, model)
-        )
-        thread.daemon = True
-        thread.start()
+        # Queue the translation for the worker pool
+        try:
+            queue_position = job_queue.submit(translation_id, temp_filepath, {
+                'target_language': target_language,
+                'provider': provider,
+                'model': model,
+                'batch_size': batch_size,
+                'token_budget': token_budget,
+                'skip_rules': skip_rules,
+                'glossary': glossary,
+                'column_context': column_context,
+                'previous_job_id': previous_job_id,
+                'previous_files': previous_files
+            })
+        except QueueFullError as e:
+            for path in [temp_filepath] + (previous_files or []):
+                os.remove(path)
+            response = jsonify({
+                'error': 'Too many translations in progress, please retry later',
+                'queue_position': e.queued + 1
+            })
+            response.headers['Retry-After'] = '30'
+            return response, 429
+
+        event_broker.publish(translation_id, {
+            'progress': 0,
+            'message': f'Queued (position {queue_position})',
+            'queue_position': queue_position
+        })
 
         return jsonify({
             'status': 'success',
             'message': 'Translation started',
-            'translation_id': translation_id
+            'translation_id': translation_id,
+            'queue_position': queue_position
         })
 
     except Exception as e:
@@ -144,27 +325,147 @@ def translate():
 @app.route('/translation-progress')
 def get_translation_progress():
     translation_id = request.args.get('id')
-    if not translation_id or translation_id not in translation_queues:
+    if not translation_id:
         return jsonify({'error': 'Invalid translation ID'}), 400
-        
+
+    if not event_broker.has(translation_id):
+        # The job may predate a restart or have been collected already
+        job = job_queue.get(translation_id)
+        if not job:
+            return jsonify({'error': 'Invalid translation ID'}), 400
+        if job['status'] in ('completed', 'failed'):
+            return Response(
+                f"data: {json.dumps(final_progress(job))}\n\n",
+                mimetype='text/event-stream'
+            )
+
+    # Browsers send Last-Event-ID when they reconnect on their own
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
     return Response(
-        send_translation_progress(translation_id),
-        mimetype='text/event-stream'
+        send_translation_progress(translation_id, last_event_id),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/translate/<translation_id>')
+def get_translation_job(translation_id):
+    job = job_queue.get(translation_id)
+    if not job:
+        return jsonify({'error': 'Invalid translation ID'}), 404
+    return jsonify({
+        'translation_id': translation_id,
+        'status': job['status'],
+        'queue_position': job_queue.position(translation_id),
+        'translated_file': job['result'],
+        'error': job['error']
+    })
+
+@app.route('/translate/<translation_id>/resume', methods=['POST'])
+def resume_translation_job(translation_id):
+    job = job_queue.get(translation_id)
+    if not job:
+        return jsonify({'error': 'Invalid translation ID'}), 404
+    if job['status'] != 'failed':
+        return jsonify({'error': f"Only failed translations can be resumed (status: {job['status']})"}), 409
+    if not os.path.exists(job['filepath']):
+        return jsonify({'error': 'The original upload is no longer available'}), 410
+
+    # Fresh progress stream for the new attempt, open before a worker can publish to it
+    translation_finished.pop(translation_id, None)
+    translation_progress.pop(translation_id, None)
+    event_broker.reset(translation_id)
+
+    try:
+        queue_position = job_queue.resume(translation_id)
+    except QueueFullError as e:
+        event_broker.publish(translation_id, final_progress(job))
+        response = jsonify({
+            'error': 'Too many translations in progress, please retry later',
+            'queue_position': e.queued + 1
+        })
+        response.headers['Retry-After'] = '30'
+        return response, 429
+    if queue_position is None:
+        return jsonify({'error': 'Translation is already being resumed'}), 409
+
+    checkpointed = get_checkpoint_store().count(translation_id)
+    event_broker.publish(translation_id, {
+        'progress': 0,
+        'message': f'Resuming from {checkpointed} checkpointed strings (position {queue_position})',
+        'queue_position': queue_position
+    })
+
+    return jsonify({
+        'status': 'success',
+        'message': 'Translation resumed',
+        'translation_id': translation_id,
+        'queue_position': queue_position,
+        'checkpointed_strings': checkpointed
+    })
+
+@app.route('/jobs/stats')
+def get_job_stats():
+    return jsonify(job_queue.stats())
+
+@app.route('/cache/stats')
+def get_cache_stats():
+    # Hit and miss counters are kept by the process that does the lookups
+    return jsonify(translation_worker.stats('memory') or get_translation_memory().stats())
+
+@app.route('/router/stats')
+def get_router_stats():
+    # Rolling p50/p95 latency and error rate per provider/model
+    return jsonify(translation_worker.stats('router') or get_router().snapshot())
+
+@app.route('/metrics')
+def get_metrics():
+    # Includes the worker process's provider and stage metrics as last reported
+    QUEUE_DEPTH.labels().set(job_queue.stats()['queued'])
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def send_output(filename):
+    """
+    Stream a translated file with ETag, Last-Modified and Range support.
+    Only translation outputs are served, never job inputs or databases.
+    """
+    if not os.path.basename(filename).startswith(OUTPUT_PREFIX):
+        return jsonify({'error': f'File not found: {filename}'}), 404
+
+    return send_from_directory(
+        os.path.abspath(app.config['UPLOAD_FOLDER']),
+        filename,
+        as_attachment=True,
+        download_name=os.path.basename(filename),
+        mimetype=output_mimetype(filename),
+        conditional=True,
+        etag=True,
+        # Output names are unique per job, so clients may keep them
+        max_age=3600
     )
 
+@app.errorhandler(413)
+def upload_too_large(e):
+    return jsonify({'error': f'File too large (limit {MAX_UPLOAD_BYTES // (1024 * 1024)} MB)'}), 413
+
+@app.teardown_request
+def discard_spooled_uploads(exc=None):
+    # Spool files that weren't moved into place by save_upload; only look if
+    # the route parsed the body, reading it here could raise a 413 again
+    if 'files' in request.__dict__:
+        for file in request.files.values():
+            discard_upload(file)
+
 @app.route('/download/<path:filename>')
 def download_file(filename):
     try:
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        if not os.path.exists(file_path):
-            return jsonify({'error': f'File not found: {filename}'}), 404
-            
-        return send_file(
-            file_path,
-            as_attachment=True,
-            download_name=filename,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+        return send_output(filename)
+    except NotFound:
+        return jsonify({'error': f'File not found: {filename}'}), 404
     except Exception as e:
         return jsonify({'error': f'Download failed: {str(e)}'}), 500
 
@@ -182,6 +483,11 @@ def get_supported_languages():
 @app.route('/providers')
 def get_providers():
     providers = [
+        {
+            # Picks provider and model per request, see services/provider_router.py
+            "name": "auto",
+            "models": ["auto"]
+        },
         {
             "name": "groq",
             "models": [
@@ -248,107 +554,39 @@ def get_ai_providers():
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
+    """
+    Translate synchronously and stream the translated workbook back as the
+    response body (no job queue, no base64)
+    """
+    if 'file' not in request.files:
+        return jsonify({"error": "No file provided"}), 400
+
+    file = request.files['file']
+    ai_provider = request.form.get('ai_provider')
+    target_language = request.form.get('target_language')
+
+    if not all([file.filename, ai_provider, target_language]):
+        return jsonify({"error": "Missing required fields"}), 400
+
+    filename = secure_filename(file.filename)
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4()}_{filename}")
+    save_upload(file, file_path)
     try:
-        if 'file' not in request.files:
-            return jsonify({"error": "No file provided"}), 400
-            
-        file = request.files['file']
-        ai_provider = request.form.get('ai_provider')
-        target_language = request.form.get('target_language')
-        
-        if not all([file, ai_provider, target_language]):
-            return jsonify({"error": "Missing required fields"}), 400
-
-        # Create temporary directory for file processing
-        with tempfile.TemporaryDirectory() as temp_dir:
-            filename = secure_filename(file.filename)
-            temp_file = os.path.join(temp_dir, filename)
-            output_file = os.path.join(temp_dir, f"translated_{filename}")
-            
-            # Save uploaded file
-            file.save(temp_file)
-            
-            # Create a copy of the original file
-            shutil.copy2(temp_file, output_file)
-            
-            # Load workbook
-            wb = openpyxl.load_workbook(output_file)
-            
-            # Process each sheet
-            for sheet_name in wb.sheetnames:
-                ws = wb[sheet_name]
-                
-                # Get all merged cell ranges
-                merged_ranges = list(ws.merged_cells.ranges)
-                
-                # Unmerge all cells temporarily
-                for merged_range in merged_ranges:
-                    ws.unmerge_cells(str(merged_range))
-                
-                # Create a list to store translations
-                translations = []
-                
-                # First pass: collect all text that needs translation
-                for row in ws.rows:
-                    for cell in row:
-                        if cell.value and isinstance(cell.value, str):
-                            translations.append({
-                                'coordinate': cell.coordinate,
-                                'text': cell.value,
-                                'style': {
-                                    'font': cell.font.copy(),
-                                    'fill': cell.fill.copy(),
-                                    'border': cell.border.copy(),
-                                    'alignment': cell.alignment.copy(),
-                                    'number_format': cell.number_format
-                                }
-                            })
-                
-                # Detect source language from the first non-empty cell
-                if translations:
-                    source_language = detect_language(translations[0]['text'])
-                    
-                    # Translate all text at once
-                    for item in translations:
-                        translated_text = translation_service.translate(
-                            text=item['text'],
-                            source_lang=source_language,
-                            target_lang=target_language,
-                            provider=ai_provider
-                        )
-                        
-                        # Update cell with translation and preserve formatting
-                        cell = ws[item['coordinate']]
-                        cell.value = translated_text
-                        
-                        # Restore original styling
-                        style = item['style']
-                        cell.font = style['font']
-                        cell.fill = style['fill']
-                        cell.border = style['border']
-                        cell.alignment = style['alignment']
-                        cell.number_format = style['number_format']
-                
-                # Reapply merged cells
-                for merged_range in merged_ranges:
-                    ws.merge_cells(str(merged_range))
-            
-            # Save the workbook
-            wb.save(output_file)
-            
-            # Read file and encode to base64
-            with open(output_file, "rb") as f:
-                file_content = base64.b64encode(f.read()).decode('utf-8')
-            
-            return jsonify({
-                "status": "success",
-                "message": "File translated successfully",
-                "filename": f"translated_{filename}",
-                "file_content": file_content
-            })
-    
+        translated_filename = translation_worker.run(str(uuid.uuid4()), {
+            'file_path': file_path,
+            'target_language': target_language,
+            'provider': ai_provider,
+            'model': request.form.get('model')
+        })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+    if not translated_filename:
+        return jsonify({"error": "No text to translate"}), 400
+    return send_output(translated_filename)
 
 if __name__ == '__main__':
     app.run(debug=False)
@@ -0,0 +1,196 @@
+"""
+End-to-end throughput benchmark for translate_excel against the mock provider.
+
+Generates synthetic workbooks in several shapes, translates each one in a
+fresh process (so peak RSS is per shape) with provider="mock", and reports
+wall time, cells/sec, provider calls and peak RSS. No network or API keys needed.
+
+    cd backend && python benchmarks/translate_throughput.py [--scale 1.0] [--shapes small_cells,many_sheets]
+    python benchmarks/translate_throughput.py --json results.json
+    python benchmarks/translate_throughput.py --baseline results.json --tolerance 0.2
+
+With --baseline the exit code is 1 when any shape's cells/sec drops more than
+`tolerance` below the baseline, so it can gate CI. Mock latency, jitter, error
+and rate-limit behaviour come from the MOCK_* environment variables
+(see services/mock_provider.py).
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openpyxl
+
+WORDS = (
+    "order invoice customer delivery amount total quantity price status pending shipped "
+    "warehouse region north south east west product category description notes payment "
+    "received overdue account manager contact address city country discount tax"
+).split()
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+def build_small_cells(path, scale, rng):
+    # Many short labels in one wide sheet
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    for r in range(1, int(5000 * scale) + 1):
+        for c in range(1, 11):
+            ws.cell(r, c, sentence(rng, rng.randint(1, 4)))
+    wb.save(path)
+
+def build_huge_cells(path, scale, rng):
+    # Few cells holding long paragraphs
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    for r in range(1, int(200 * scale) + 1):
+        ws.cell(r, 1, ". ".join(sentence(rng, 12) for _ in range(40)))
+    wb.save(path)
+
+def build_many_sheets(path, scale, rng):
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    for s in range(int(200 * scale) or 1):
+        ws = wb.create_sheet(f"Sheet{s + 1}")
+        for r in range(1, 51):
+            for c in range(1, 6):
+                ws.cell(r, c, sentence(rng, rng.randint(1, 6)))
+    wb.save(path)
+
+def build_heavy_merges(path, scale, rng):
+    # Every row is a merged header band followed by merged value pairs
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    for r in range(1, int(4000 * scale) + 1):
+        ws.cell(r, 1, sentence(rng, 3))
+        ws.merge_cells(start_row=r, start_column=1, end_row=r, end_column=4)
+        for c in range(5, 13, 2):
+            ws.cell(r, c, sentence(rng, 2))
+            ws.merge_cells(start_row=r, start_column=c, end_row=r, end_column=c + 1)
+    wb.save(path)
+
+def build_high_duplication(path, scale, rng):
+    # 100k cells drawn from 50 distinct strings
+    vocabulary = [sentence(rng, 3) for _ in range(50)]
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    for r in range(1, int(10000 * scale) + 1):
+        for c in range(1, 11):
+            ws.cell(r, c, rng.choice(vocabulary))
+    wb.save(path)
+
+SHAPES = {
+    'small_cells': build_small_cells,
+    'huge_cells': build_huge_cells,
+    'many_sheets': build_many_sheets,
+    'heavy_merges': build_heavy_merges,
+    'high_duplication': build_high_duplication,
+}
+
+# Maps --path to translate_excel keyword arguments
+PATHS = {
+    'auto': {},
+    'openpyxl': {'shared_strings_only': False, 'streaming': False},
+    'streaming': {'shared_strings_only': False, 'streaming': True},
+    'shared_strings': {'shared_strings_only': True},
+}
+
+def run_shape(path, mode, work_dir):
+    """
+    Translate one workbook in this process and return its measurements
+    """
+    from services.provider_clients import get_client
+    from services.translation_memory import TranslationMemory
+    from services.translation_service import TranslationService
+
+    os.chdir(work_dir)
+    os.makedirs('uploads', exist_ok=True)
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    cells = sum(
+        1 for sheet in workbook.worksheets for row in sheet.iter_rows(values_only=True)
+        for value in row if isinstance(value, str) and value.strip()
+    )
+    workbook.close()
+
+    # A fresh memory so every string goes through the mock provider
+    service = TranslationService(memory=TranslationMemory(db_path=os.path.join(work_dir, f'tm_{time.time()}.db')))
+    start = time.perf_counter()
+    service.translate_excel(path, 'es', provider='mock', **PATHS[mode])
+    elapsed = time.perf_counter() - start
+
+    provider = get_client('mock').stats()
+    return {
+        'cells': cells,
+        'seconds': round(elapsed, 3),
+        'cells_per_sec': round(cells / elapsed, 1) if elapsed else 0.0,
+        'provider_calls': provider['calls'],
+        'provider_errors': provider['errors'] + provider['rate_limited'],
+        # ru_maxrss is in KB on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for shape, result in results.items():
+        expected = baseline.get(shape, {}).get('cells_per_sec')
+        if expected and result['cells_per_sec'] < expected * (1 - tolerance):
+            regressions.append(f"{shape}: {result['cells_per_sec']} cells/sec vs baseline {expected}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplier for the size of every shape')
+    parser.add_argument('--shapes', default=','.join(SHAPES), help='comma separated shapes to run')
+    parser.add_argument('--path', choices=list(PATHS), default='auto', help='translate_excel code path')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--baseline', help='results file from an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed cells/sec drop against the baseline')
+    parser.add_argument('--run-shape', nargs=2, metavar=('WORKBOOK', 'WORK_DIR'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_shape:
+        print(json.dumps(run_shape(args.run_shape[0], args.path, args.run_shape[1])))
+        return
+
+    shapes = [shape.strip() for shape in args.shapes.split(',') if shape.strip()]
+    unknown = [shape for shape in shapes if shape not in SHAPES]
+    if unknown:
+        parser.error(f"Unknown shapes: {', '.join(unknown)}")
+
+    results = {}
+    print(f"{'shape':<18}{'cells':>9}{'seconds':>10}{'cells/s':>10}{'calls':>8}{'errors':>8}{'rss MB':>9}")
+    with tempfile.TemporaryDirectory() as work_dir:
+        for shape in shapes:
+            path = os.path.join(work_dir, f'{shape}.xlsx')
+            SHAPES[shape](path, args.scale, random.Random(args.seed))
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--path', args.path, '--run-shape', path, work_dir],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = results[shape] = json.loads(output.strip().splitlines()[-1])
+            print(
+                f"{shape:<18}{result['cells']:>9}{result['seconds']:>10.2f}{result['cells_per_sec']:>10.1f}"
+                f"{result['provider_calls']:>8}{result['provider_errors']:>8}{result['peak_rss_mb']:>9.1f}"
+            )
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
+
+if __name__ == '__main__':
+    main()
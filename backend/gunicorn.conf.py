@@ -0,0 +1,23 @@
+# Production server settings:  gunicorn -c gunicorn.conf.py app:app
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+
+# The job queue and progress broker live in the app process, so everything
+# has to be served by a single worker. Workbooks are translated in a separate
+# worker process (services/translation_worker.py) and never run on this one.
+workers = 1
+
+# Each open progress stream (SSE) is a greenlet parked on the broker, so idle
+# viewers cost memory rather than OS threads
+try:
+    import gevent  # noqa: F401
+    worker_class = 'gevent'
+    worker_connections = int(os.getenv('SSE_MAX_CONNECTIONS', 2000))
+except ImportError:
+    # Without gevent every open stream holds one thread, so size this for
+    # the expected number of viewers
+    worker_class = 'gthread'
+    threads = int(os.getenv('GUNICORN_THREADS', os.getenv('SSE_MAX_CONNECTIONS', 256)))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
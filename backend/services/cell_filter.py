@@ -0,0 +1,67 @@
+import os
+import re
+
+# Patterns for cell strings that never need translating. Each rule can be
+# switched off on its own; all of them match the whole (stripped) string.
+SKIP_RULES = {
+    # "1,234.50", "-12%", "$ 1 000", "(350.00)"
+    'number': re.compile(r'^[+\-(]?[$€£¥]?\s?\d[\d.,\s ]*%?\)?$'),
+    # "2024-03-01", "2024-03-01T10:15:00Z", "01/03/2024"
+    'date': re.compile(
+        r'^(\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:?\d{2})?)?'
+        r'|\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}'
+        r'|\d{1,2}:\d{2}(:\d{2})?)$'
+    ),
+    'email': re.compile(r'^[\w.+-]+@[\w-]+(\.[\w-]+)+$'),
+    'url': re.compile(r'^(https?://|ftp://|www\.)\S+$', re.IGNORECASE),
+    # Formulas stored as text, e.g. "=SUM(A1:A3)"
+    'formula': re.compile(r'^=[A-Za-z_(].*$'),
+    # SKUs and IDs: upper-case letters and digits with separators, at least one digit
+    'code': re.compile(r'^(?=[^\s]*\d)[A-Z0-9]+([-_/.#][A-Z0-9]+)*$'),
+    # Lone symbols or punctuation such as "-", "*" or "%"
+    'symbol': re.compile(r'^[^\w\s]{1,3}$'),
+}
+
+def enabled_rules():
+    """
+    Rules enabled through SKIP_RULES (comma separated), all of them by default
+    """
+    configured = os.getenv('SKIP_RULES')
+    if configured is None:
+        return list(SKIP_RULES)
+    return [rule.strip() for rule in configured.split(',') if rule.strip()]
+
+class CellFilter:
+    """
+    Marks cell strings as pass-through before any provider call
+    """
+
+    def __init__(self, rules=None):
+        rules = enabled_rules() if rules is None else rules
+        unknown = [rule for rule in rules if rule not in SKIP_RULES]
+        if unknown:
+            raise ValueError(f"Unknown skip rules: {', '.join(unknown)}")
+        self.rules = [(rule, SKIP_RULES[rule]) for rule in rules]
+
+    def classify(self, text):
+        """
+        Name of the first rule matching `text`, or None if it should be translated
+        """
+        for rule, pattern in self.rules:
+            if pattern.match(text):
+                return rule
+        return None
+
+    def split(self, texts):
+        """
+        Split texts into (to_translate, skipped) where skipped maps rule -> texts
+        """
+        to_translate = []
+        skipped = {}
+        for text in texts:
+            rule = self.classify(text)
+            if rule:
+                skipped.setdefault(rule, []).append(text)
+            else:
+                to_translate.append(text)
+        return to_translate, skipped
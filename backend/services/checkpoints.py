@@ -0,0 +1,78 @@
+import os
+import sqlite3
+import threading
+import time
+
+class CheckpointStore:
+    """
+    Translations completed by a job, keyed by job ID and source string.
+    Each target language of a job saves under "<job id>:<language>"; count
+    and clear take the bare job ID and cover all of its languages.
+    A failed or interrupted job reloads them on resume instead of calling
+    the provider again for work it already did.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.getenv('CHECKPOINT_DB_PATH', os.path.join('uploads', 'checkpoints.db'))
+
+        directory = os.path.dirname(self.db_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "job_id TEXT NOT NULL, "
+            "text TEXT NOT NULL, "
+            "translation TEXT NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "PRIMARY KEY (job_id, text))"
+        )
+        self.conn.commit()
+
+    def load(self, job_id):
+        """
+        Dict of text -> translation saved so far for a job
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT text, translation FROM checkpoints WHERE job_id = ?", (job_id,)
+            ).fetchall()
+        return dict(rows)
+
+    def save(self, job_id, translations):
+        if not translations:
+            return
+        now = time.time()
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO checkpoints (job_id, text, translation, created_at) VALUES (?, ?, ?, ?)",
+                [(job_id, text, translation, now) for text, translation in translations.items()]
+            )
+            self.conn.commit()
+
+    def count(self, job_id):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM checkpoints WHERE job_id = ? OR job_id LIKE ?", (job_id, f"{job_id}:%")
+            ).fetchone()[0]
+
+    def clear(self, job_id):
+        with self.lock:
+            self.conn.execute("DELETE FROM checkpoints WHERE job_id = ? OR job_id LIKE ?", (job_id, f"{job_id}:%"))
+            self.conn.commit()
+
+_checkpoint_store = None
+_checkpoint_store_lock = threading.Lock()
+
+def get_checkpoint_store():
+    """
+    Return the process-wide checkpoint store, creating it on first use
+    """
+    global _checkpoint_store
+    with _checkpoint_store_lock:
+        if _checkpoint_store is None:
+            _checkpoint_store = CheckpointStore()
+        return _checkpoint_store
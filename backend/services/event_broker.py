@@ -0,0 +1,174 @@
+import os
+import threading
+import time
+from collections import deque
+
+# Progress events are coalesced to at most this many per second per job, partial results per cell
+EVENTS_PER_SECOND = float(os.getenv('SSE_EVENTS_PER_SECOND', 4))
+
+# Idle streams get a comment line this often so proxies keep them open
+HEARTBEAT_SECONDS = float(os.getenv('SSE_HEARTBEAT_SECONDS', 15))
+
+# Events kept per job for subscribers that fall behind or reconnect
+HISTORY_SIZE = int(os.getenv('SSE_HISTORY_SIZE', 50))
+
+def event_kind(data):
+    """
+    Coalescing slot for an event, or None for events that are always delivered.
+    Partial results get a slot per source cell so one cell never replaces another's.
+    """
+    if data.get('complete') or data.get('error'):
+        return None
+    if 'partial' in data:
+        return ('partial', data['partial'].get('source'))
+    return 'progress'
+
+class Channel:
+    """
+    Event stream of one job. Events get increasing ids; throttled kinds keep
+    only their latest pending value until the next send slot.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.seq = 0
+        self.history = deque(maxlen=HISTORY_SIZE)
+        self.pending = {}
+        self.last_sent = {}
+        self.state = None
+        self.closed = False
+
+    def publish(self, data):
+        with self.condition:
+            if self.closed:
+                return
+            kind = event_kind(data)
+            if kind is None:
+                # Flush what is pending so the final event is also the last one
+                for pending_kind in list(self.pending):
+                    self._emit(self.pending.pop(pending_kind), pending_kind)
+                self._emit(data, kind)
+                self.closed = bool(data.get('complete'))
+            else:
+                self.pending[kind] = data
+                self._release_due()
+            self.condition.notify_all()
+
+    def _emit(self, data, kind):
+        # Called with the condition held
+        self.seq += 1
+        self.history.append((self.seq, data))
+        if kind == 'progress':
+            self.last_sent[kind] = time.monotonic()
+        elif kind is not None:
+            # A finished cell's slot is not needed anymore
+            if data['partial'].get('done'):
+                self.last_sent.pop(kind, None)
+            else:
+                self.last_sent[kind] = time.monotonic()
+        if kind is None or kind == 'progress':
+            self.state = (self.seq, data)
+
+    def _release_due(self):
+        """
+        Emit pending events whose send slot has come; returns seconds until
+        the next one is due, or None if nothing is pending
+        """
+        interval = 1.0 / EVENTS_PER_SECOND if EVENTS_PER_SECOND > 0 else 0.0
+        now = time.monotonic()
+        next_due = None
+        for kind in list(self.pending):
+            due = self.last_sent.get(kind, 0.0) + interval
+            if due <= now:
+                self._emit(self.pending.pop(kind), kind)
+            else:
+                next_due = due - now if next_due is None else min(next_due, due - now)
+        return next_due
+
+    def events_after(self, last_id):
+        """
+        Events a subscriber that saw `last_id` still has to get. If the
+        history no longer reaches back that far (or the id is unknown) the
+        latest state is sent instead of the gap.
+        """
+        known = last_id is not None and last_id <= self.seq
+        if known and self.history and self.history[0][0] <= last_id + 1:
+            return [(event_id, data) for event_id, data in self.history if event_id > last_id]
+        events = [self.state] if self.state else []
+        if self.closed and self.history and self.history[-1] not in events:
+            events.append(self.history[-1])
+        if known:
+            events = [event for event in events if event[0] > last_id]
+        return events
+
+    def subscribe(self, last_id=None, heartbeat=None):
+        """
+        Yield (event_id, data) pairs as they are published, or (None, None)
+        when nothing happened for HEARTBEAT_SECONDS. Ends after the final event.
+        """
+        heartbeat = heartbeat or HEARTBEAT_SECONDS
+        while True:
+            with self.condition:
+                deadline = time.monotonic() + heartbeat
+                while True:
+                    next_due = self._release_due()
+                    events = self.events_after(last_id)
+                    if events or self.closed:
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(min(remaining, next_due) if next_due is not None else remaining)
+                closed = self.closed
+            if not events and not closed:
+                yield None, None
+                continue
+            for event_id, data in events:
+                last_id = event_id
+                yield event_id, data
+            if closed and last_id == self.seq:
+                return
+
+class EventBroker:
+    """
+    Fan-out of job progress events to any number of SSE subscribers.
+    Subscribers block on a condition instead of polling, so an idle stream
+    costs a parked greenlet (see gunicorn.conf.py) and no CPU.
+    """
+
+    def __init__(self):
+        self.channels = {}
+        self.lock = threading.Lock()
+
+    def channel(self, job_id):
+        with self.lock:
+            channel = self.channels.get(job_id)
+            if channel is None:
+                channel = self.channels[job_id] = Channel()
+            return channel
+
+    def publish(self, job_id, data):
+        self.channel(job_id).publish(data)
+
+    def subscribe(self, job_id, last_id=None):
+        return self.channel(job_id).subscribe(last_id)
+
+    def has(self, job_id):
+        with self.lock:
+            return job_id in self.channels
+
+    def reset(self, job_id):
+        """
+        Start a fresh stream for a job that runs again (e.g. on resume)
+        """
+        with self.lock:
+            old = self.channels.get(job_id)
+            channel = self.channels[job_id] = Channel()
+            if old:
+                # Continue numbering so Last-Event-ID from the old stream stays comparable
+                channel.seq = old.seq
+        return channel
+
+    def discard(self, job_id):
+        with self.lock:
+            self.channels.pop(job_id, None)
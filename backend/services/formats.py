@@ -0,0 +1,224 @@
+import csv
+import io
+import os
+import sys
+
+# Encoding of CSV/TSV uploads; a UTF-8 byte order mark is detected and kept either way
+CSV_ENCODING = os.getenv('CSV_ENCODING', 'utf-8')
+
+# Bytes read to guess the delimiter and quoting of a .csv file
+CSV_SNIFF_BYTES = 64 * 1024
+
+# Cells of multi-GB exports can be far bigger than the csv module's 128 KB default
+csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+
+MIMETYPES = {
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    '.csv': 'text/csv',
+    '.tsv': 'text/tab-separated-values',
+    '.zip': 'application/zip',
+}
+
+class FormatBackend:
+    """
+    Reader/writer for one file format. Row-based backends yield plain cell
+    values sheet by sheet and write them back the same way, so every format
+    but xlsx goes through the same extraction, dedup and translation pipeline
+    (TranslationService.translate_rows) with constant memory.
+    """
+
+    name = None
+    extensions = ()
+    # Translations are written in this format; None keeps the input's extension
+    output_extension = None
+
+    def __init__(self, path):
+        self.path = path
+
+    def sheets(self):
+        """
+        Yield (title, rows) per sheet, where rows iterates lists of cell values
+        """
+        raise NotImplementedError
+
+    def progress(self):
+        """
+        Fraction of the input read so far, for progress reporting
+        """
+        return 0.0
+
+    def open_writer(self, path):
+        raise NotImplementedError
+
+class XlsxWriter:
+    """
+    Write-only openpyxl workbook filled row by row
+    """
+
+    def __init__(self, path):
+        import openpyxl
+        self.path = path
+        self.workbook = openpyxl.Workbook(write_only=True)
+        self.sheet = None
+
+    def add_sheet(self, title):
+        self.sheet = self.workbook.create_sheet(title)
+
+    def append(self, row):
+        self.sheet.append(row)
+
+    def close(self):
+        if self.sheet is None:
+            self.workbook.create_sheet()
+        self.workbook.save(self.path)
+
+class XlsxBackend(FormatBackend):
+    """
+    xlsx packages. TranslationService.translate_excel translates these
+    with its own paths (openpyxl, streaming, shared strings) that keep
+    styles and layout; the reader here is for values only, e.g. when pairing
+    an earlier version of a file with its translation.
+    """
+
+    name = 'xlsx'
+    extensions = ('.xlsx',)
+
+    def sheets(self):
+        import openpyxl
+        workbook = openpyxl.load_workbook(self.path, read_only=True)
+        try:
+            for sheet in workbook.worksheets:
+                yield sheet.title, (list(row) for row in sheet.iter_rows(values_only=True))
+        finally:
+            workbook.close()
+
+class XlsBackend(FormatBackend):
+    """
+    Legacy .xls (BIFF) workbooks, read with xlrd and written as .xlsx since
+    nothing maintained writes .xls anymore. Cell values and dates are kept;
+    formatting is not carried over.
+    """
+
+    name = 'xls'
+    extensions = ('.xls',)
+    output_extension = '.xlsx'
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.rows_read = 0
+        self.total_rows = 0
+
+    def sheets(self):
+        try:
+            import xlrd
+        except ImportError:
+            raise RuntimeError("Reading .xls files needs the xlrd package (pip install xlrd)")
+
+        book = xlrd.open_workbook(self.path, on_demand=True)
+        try:
+            self.total_rows = sum(book.sheet_by_index(i).nrows for i in range(book.nsheets)) or 1
+            for index in range(book.nsheets):
+                sheet = book.sheet_by_index(index)
+                yield sheet.name, self._rows(xlrd, book, sheet)
+                book.unload_sheet(index)
+        finally:
+            book.release_resources()
+
+    def _rows(self, xlrd, book, sheet):
+        for r in range(sheet.nrows):
+            self.rows_read += 1
+            yield [self._value(xlrd, book, cell) for cell in sheet.row(r)]
+
+    @staticmethod
+    def _value(xlrd, book, cell):
+        if cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK, xlrd.XL_CELL_ERROR):
+            return None
+        if cell.ctype == xlrd.XL_CELL_DATE:
+            return xlrd.xldate_as_datetime(cell.value, book.datemode)
+        if cell.ctype == xlrd.XL_CELL_BOOLEAN:
+            return bool(cell.value)
+        if cell.ctype == xlrd.XL_CELL_NUMBER and float(cell.value).is_integer():
+            return int(cell.value)
+        return cell.value
+
+    def progress(self):
+        return self.rows_read / self.total_rows if self.total_rows else 0.0
+
+    def open_writer(self, path):
+        return XlsxWriter(path)
+
+class DelimitedWriter:
+    def __init__(self, path, dialect, encoding):
+        self.file = open(path, 'w', encoding=encoding, newline='')
+        self.writer = csv.writer(self.file, dialect)
+
+    def add_sheet(self, title):
+        pass
+
+    def append(self, row):
+        self.writer.writerow(['' if value is None else value for value in row])
+
+    def close(self):
+        self.file.close()
+
+class DelimitedBackend(FormatBackend):
+    """
+    CSV and TSV files, streamed row by row so multi-GB exports never sit in
+    memory. The dialect is sniffed for .csv (tab for .tsv) and reused for the
+    output, as is a UTF-8 byte order mark. Every value is a string.
+    """
+
+    name = 'csv'
+    extensions = ('.csv', '.tsv')
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.size = os.path.getsize(path) or 1
+        self.raw = None
+        with open(path, 'rb') as f:
+            sample = f.read(CSV_SNIFF_BYTES)
+        self.encoding = 'utf-8-sig' if sample.startswith(b'\xef\xbb\xbf') else CSV_ENCODING
+        if path.lower().endswith('.tsv'):
+            self.dialect = csv.excel_tab
+        else:
+            try:
+                text = sample.decode(self.encoding, errors='ignore')
+                self.dialect = csv.Sniffer().sniff(text, delimiters=',;\t|')
+            except csv.Error:
+                self.dialect = csv.excel
+
+    def sheets(self):
+        with open(self.path, 'rb') as raw:
+            self.raw = raw
+            text = io.TextIOWrapper(raw, encoding=self.encoding, newline='')
+            title = os.path.splitext(os.path.basename(self.path))[0][:31]
+            yield title, csv.reader(text, self.dialect)
+            self.raw = None
+
+    def progress(self):
+        # Position of the underlying binary file, slightly ahead of the parser
+        if self.raw is None or self.raw.closed:
+            return 0.0
+        return min(self.raw.tell() / self.size, 1.0)
+
+    def open_writer(self, path):
+        return DelimitedWriter(path, self.dialect, self.encoding)
+
+BACKENDS = (XlsxBackend, XlsBackend, DelimitedBackend)
+
+SUPPORTED_EXTENSIONS = tuple(extension for backend in BACKENDS for extension in backend.extensions)
+
+def get_backend(path):
+    """
+    Backend instance for a file, chosen by its extension. Anything else is
+    left to openpyxl, which has the final say on whether it is a workbook.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    for backend in BACKENDS:
+        if extension in backend.extensions:
+            return backend(path)
+    return XlsxBackend(path)
+
+def output_mimetype(filename):
+    # Multi-language jobs produce a zip with one file per language
+    return MIMETYPES.get(os.path.splitext(filename)[1].lower(), 'application/octet-stream')
@@ -0,0 +1,96 @@
+import json
+import re
+from services.language_detection import language_code
+
+# Stand-in for a glossary term while the rest of the string is translated
+PLACEHOLDER = "⟦{}⟧"
+PLACEHOLDER_PATTERN = re.compile(r"⟦(\d+)⟧")
+
+class GlossaryError(ValueError):
+    pass
+
+class Glossary:
+    """
+    Per-job term map. Terms are swapped for numbered placeholders before a
+    string goes to the provider and the target term is put back afterwards,
+    so every occurrence comes out the same. Targets are either one string or
+    a dict of target language -> string, e.g.
+    {"Invoice": "Factura", "Order": {"es": "Pedido", "fr": "Commande"}}.
+    """
+
+    def __init__(self, terms):
+        if not isinstance(terms, dict):
+            raise GlossaryError("Glossary must be a JSON object of source term -> target term")
+        self.terms = []
+        for source, target in terms.items():
+            if not isinstance(source, str) or not source.strip():
+                raise GlossaryError("Glossary terms must be non-empty strings")
+            if isinstance(target, dict):
+                targets = {language_code(language): value for language, value in target.items()}
+            elif isinstance(target, str):
+                targets = {None: target}
+            else:
+                raise GlossaryError(f"Invalid glossary target for '{source}'")
+            self.terms.append((source.strip(), targets))
+        # One pass over the string, longest terms first so "Sales order" wins over "order"
+        self.terms.sort(key=lambda term: len(term[0]), reverse=True)
+        self.index = {source.casefold(): index for index, (source, _) in enumerate(self.terms)}
+        self.pattern = re.compile(
+            "|".join(
+                (r"\b" if re.match(r"\w", source) else "") + re.escape(source) + (r"\b" if re.search(r"\w$", source) else "")
+                for source, _ in self.terms
+            ),
+            re.IGNORECASE
+        )
+
+    @classmethod
+    def parse(cls, value):
+        """
+        Glossary from a JSON string or dict; None when empty
+        """
+        if not value:
+            return None
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except ValueError as e:
+                raise GlossaryError(f"Glossary is not valid JSON: {e}")
+        return cls(value) if value else None
+
+    def __len__(self):
+        return len(self.terms)
+
+    def target(self, index, target_language):
+        targets = self.terms[index][1]
+        return targets.get(language_code(target_language), targets.get(None))
+
+    def lookup(self, text, target_language):
+        """
+        Target term when the whole string is a glossary term, else None
+        """
+        index = self.index.get(text.casefold())
+        return None if index is None else self.target(index, target_language)
+
+    def protect(self, text, target_language):
+        """
+        Replace the terms that have a target for this language with placeholders
+        """
+        def replace(match):
+            index = self.index.get(match.group(0).casefold())
+            if index is None or self.target(index, target_language) is None:
+                return match.group(0)
+            return PLACEHOLDER.format(index)
+
+        return self.pattern.sub(replace, text)
+
+    def restore(self, text, target_language):
+        """
+        Put the target terms back in place of the placeholders of a translation
+        """
+        def replace(match):
+            index = int(match.group(1))
+            if index >= len(self.terms):
+                return match.group(0)
+            return self.target(index, target_language) or match.group(0)
+
+        return PLACEHOLDER_PATTERN.sub(replace, text)
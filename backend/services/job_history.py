@@ -0,0 +1,94 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# Translations of finished jobs are kept this long for incremental re-translation
+JOB_HISTORY_TTL = int(os.getenv('JOB_HISTORY_TTL', 90 * 24 * 3600))
+
+def content_hash(text):
+    """
+    Key of a normalized cell string in job manifests
+    """
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+class JobHistory:
+    """
+    Manifest of every job: content hash of each source string -> its
+    translation, per target language. A new version of a file can reference
+    an earlier job and only strings whose hash is not in its manifest get
+    translated; the rest reuse the earlier output.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.getenv('JOB_HISTORY_DB_PATH', os.path.join('uploads', 'job_history.db'))
+
+        directory = os.path.dirname(self.db_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_translations ("
+            "job_id TEXT NOT NULL, "
+            "language TEXT NOT NULL, "
+            "hash TEXT NOT NULL, "
+            "translation TEXT NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "PRIMARY KEY (job_id, language, hash))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_job_translations_created_at ON job_translations (created_at)")
+        self.conn.commit()
+
+    def record(self, job_id, language, translations):
+        """
+        Add a dict of text -> translation to a job's manifest
+        """
+        if not translations:
+            return
+        now = time.time()
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO job_translations (job_id, language, hash, translation, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(job_id, language, content_hash(text), translation, now) for text, translation in translations.items()]
+            )
+            self.conn.commit()
+
+    def load(self, job_id, language):
+        """
+        Dict of content hash -> translation of a job for one language
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT hash, translation FROM job_translations WHERE job_id = ? AND language = ?", (job_id, language)
+            ).fetchall()
+        return dict(rows)
+
+    def languages(self, job_id):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT DISTINCT language FROM job_translations WHERE job_id = ?", (job_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def purge(self, ttl=JOB_HISTORY_TTL):
+        with self.lock:
+            cursor = self.conn.execute("DELETE FROM job_translations WHERE created_at < ?", (time.time() - ttl,))
+            self.conn.commit()
+            return cursor.rowcount
+
+_job_history = None
+_job_history_lock = threading.Lock()
+
+def get_job_history():
+    """
+    Return the process-wide job history, creating it on first use
+    """
+    global _job_history
+    with _job_history_lock:
+        if _job_history is None:
+            _job_history = JobHistory()
+        return _job_history
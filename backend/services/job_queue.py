@@ -0,0 +1,208 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class QueueFullError(Exception):
+    """
+    Raised when the queue already holds `max_queued` waiting jobs
+    """
+
+    def __init__(self, queued):
+        super().__init__(f"Translation queue is full ({queued} jobs waiting)")
+        self.queued = queued
+
+class JobQueue:
+    """
+    Persistent job queue with a bounded pool of worker threads.
+    Jobs are stored in SQLite so they survive a restart: anything still
+    queued or running when the process stopped is picked up again.
+    `on_finish(job)` is called with the updated row once a job has completed
+    or failed, so anything it announces is already visible through get().
+    """
+
+    def __init__(self, handler, db_path=None, workers=None, max_queued=None, on_finish=None):
+        self.handler = handler
+        self.on_finish = on_finish
+        self.db_path = db_path or os.getenv('JOB_DB_PATH', os.path.join('uploads', 'jobs.db'))
+        self.workers = workers or int(os.getenv('TRANSLATION_WORKERS', 2))
+        self.max_queued = max_queued or int(os.getenv('TRANSLATION_MAX_QUEUED', 20))
+
+        directory = os.path.dirname(self.db_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.lock = threading.Lock()
+        self.available = threading.Condition(self.lock)
+        self.threads = []
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, "
+            "filepath TEXT NOT NULL, "
+            "params TEXT NOT NULL, "
+            "status TEXT NOT NULL, "
+            "result TEXT, "
+            "error TEXT, "
+            "created_at REAL NOT NULL, "
+            "updated_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+        self.conn.commit()
+
+    def start(self):
+        """
+        Requeue jobs interrupted by a restart and start the worker threads
+        """
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'running'",
+                (time.time(),)
+            )
+            self.conn.commit()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"translation-worker-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, job_id, filepath, params):
+        """
+        Add a job and return its position in the queue (1 = next to run).
+        Raises QueueFullError when admission control rejects it.
+        """
+        now = time.time()
+        with self.lock:
+            queued = self._count_queued()
+            if queued >= self.max_queued:
+                raise QueueFullError(queued)
+            self.conn.execute(
+                "INSERT INTO jobs (id, filepath, params, status, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, filepath, json.dumps(params), now, now)
+            )
+            self.conn.commit()
+            self.available.notify()
+            return queued + 1
+
+    def resume(self, job_id):
+        """
+        Queue a failed job again and return its new position, or None if the
+        job doesn't exist or hasn't failed. Raises QueueFullError like submit.
+        """
+        now = time.time()
+        with self.lock:
+            queued = self._count_queued()
+            if queued >= self.max_queued:
+                raise QueueFullError(queued)
+            cursor = self.conn.execute(
+                "UPDATE jobs SET status = 'queued', error = NULL, created_at = ?, updated_at = ? "
+                "WHERE id = ? AND status = 'failed'",
+                (now, now, job_id)
+            )
+            self.conn.commit()
+            if not cursor.rowcount:
+                return None
+            self.available.notify()
+            return queued + 1
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def position(self, job_id):
+        """
+        Position of a queued job, or 0 if it is no longer waiting
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created_at <= "
+                "(SELECT created_at FROM jobs WHERE id = ? AND status = 'queued')",
+                (job_id,)
+            ).fetchone()
+        return row[0]
+
+    def stats(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {status: count for status, count in rows}
+        return {
+            'workers': self.workers,
+            'max_queued': self.max_queued,
+            'queued': counts.get('queued', 0),
+            'running': counts.get('running', 0),
+            'completed': counts.get('completed', 0),
+            'failed': counts.get('failed', 0)
+        }
+
+    def purge(self, older_than):
+        """
+        Delete finished jobs last updated more than `older_than` seconds ago
+        and return them so their files can be cleaned up
+        """
+        cutoff = time.time() - older_than
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT * FROM jobs WHERE status IN ('completed', 'failed') AND updated_at < ?", (cutoff,)
+            ).fetchall()
+            self.conn.execute(
+                "DELETE FROM jobs WHERE status IN ('completed', 'failed') AND updated_at < ?", (cutoff,)
+            )
+            self.conn.commit()
+        return [self._to_dict(row) for row in rows]
+
+    def _count_queued(self):
+        return self.conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def _claim_next(self):
+        # Called with the lock held
+        row = self.conn.execute(
+            "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+        ).fetchone()
+        if not row:
+            return None
+        cursor = self.conn.execute(
+            "UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ? AND status = 'queued'",
+            (time.time(), row['id'])
+        )
+        self.conn.commit()
+        return self._to_dict(row) if cursor.rowcount else None
+
+    def _finish(self, job_id, status, result=None, error=None):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, result, error, time.time(), job_id)
+            )
+            self.conn.commit()
+
+    def _work(self):
+        while True:
+            with self.lock:
+                job = self._claim_next()
+                while job is None:
+                    # Wake up periodically in case another process queued work
+                    self.available.wait(timeout=5)
+                    job = self._claim_next()
+            try:
+                result = self.handler(job)
+                self._finish(job['id'], 'completed', result=result)
+            except Exception as e:
+                logger.exception("Translation job %s failed", job['id'])
+                self._finish(job['id'], 'failed', error=str(e))
+            if self.on_finish:
+                try:
+                    self.on_finish(self.get(job['id']))
+                except Exception:
+                    logger.exception("Finishing translation job %s failed", job['id'])
+
+    @staticmethod
+    def _to_dict(row):
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        return job
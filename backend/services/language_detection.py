@@ -1,19 +1,110 @@
-from langdetect import detect
+from langdetect import DetectorFactory
+from langdetect.detector_factory import PROFILES_DIRECTORY
+from langdetect.lang_detect_exception import LangDetectException
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+
+# langdetect is randomized; a fixed seed makes results reproducible between runs
+DetectorFactory.seed = 0
+
+# Profiles are loaded once here rather than lazily on the first call, which
+# isn't safe from several threads; every detection then gets its own detector
+_factory = DetectorFactory()
+_factory.load_profile(PROFILES_DIRECTORY)
+
+# Detection is unreliable on short labels ("Total" comes out as Finnish),
+# so shorter strings or low-confidence results count as unknown
+MIN_DETECT_LENGTH = int(os.getenv('MIN_DETECT_LENGTH', 12))
+MIN_DETECT_PROBABILITY = float(os.getenv('MIN_DETECT_PROBABILITY', 0.9))
+
+# Random trials averaged per detection; cost is linear in this (langdetect uses 7),
+# fewer trials only turn some borderline results into unknown
+DETECT_TRIALS = int(os.getenv('DETECT_TRIALS', 3))
+
+# Number of detection results memoized per process
+DETECTION_CACHE_SIZE = int(os.getenv('DETECTION_CACHE_SIZE', 100000))
+
+LANGUAGE_NAMES = {
+    "en": "English",
+    "es": "Spanish",
+    "fr": "French",
+    "de": "German",
+    "it": "Italian",
+    "pt": "Portuguese",
+    "nl": "Dutch",
+    "ru": "Russian",
+    "zh-cn": "Chinese",
+    "zh-tw": "Chinese",
+    "ja": "Japanese",
+    "ko": "Korean",
+    "ar": "Arabic",
+}
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def language_code(language):
+    """
+    ISO 639-1 code for a language given as a code or an English name, or a
+    detector result such as "zh-cn"
+    """
+    language = (language or "").strip()
+    for code, name in LANGUAGE_NAMES.items():
+        if language.lower() in (code, name.lower()):
+            return code.split('-')[0]
+    return language.lower()
+
+def language_name(code):
+    return LANGUAGE_NAMES.get(code, code)
+
+def _detect_uncached(text):
+    letters = sum(1 for char in text if char.isalpha())
+    if letters < MIN_DETECT_LENGTH:
+        return None
+    try:
+        detector = _factory.create()
+        detector.n_trial = DETECT_TRIALS
+        detector.append(text)
+        best = detector.get_probabilities()[0]
+    except LangDetectException:
+        return None
+    return best.lang if best.prob >= MIN_DETECT_PROBABILITY else None
+
+def detect_languages(texts):
+    """
+    Detect the language of many strings in one pass.
+    Returns a dict of text -> ISO 639-1 code, or None when the text is too
+    short or the detector isn't confident. Results are memoized by string hash.
+    """
+    results = {}
+    for text in texts:
+        key = hashlib.sha1(text.encode('utf-8')).digest()
+        with _cache_lock:
+            if key in _cache:
+                _cache.move_to_end(key)
+                results[text] = _cache[key]
+                continue
+        language = _detect_uncached(text)
+        with _cache_lock:
+            _cache[key] = language
+            if len(_cache) > DETECTION_CACHE_SIZE:
+                _cache.popitem(last=False)
+        results[text] = language
+    return results
 
 def detect_language(text: str) -> str:
     """
-    A simple function to detect the language of the text.
-    For now, we'll assume English as the source language.
-    In a production environment, you would want to use a proper language detection library.
+    Detect the language of the text and return its English name.
+    Falls back to English when the language can't be determined.
     """
-    return "English"
+    code = detect_languages([text])[text]
+    return language_name(code) if code else "English"
 
 def detect_language_advanced(text: str) -> str:
     """
     Detect the language of the input text.
     Returns the ISO 639-1 language code.
     """
-    try:
-        return detect(text)
-    except:
-        return "en"  # Default to English if detection fails
+    return detect_languages([text])[text] or "en"  # Default to English if detection fails
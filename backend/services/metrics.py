@@ -0,0 +1,245 @@
+import bisect
+import threading
+import time
+
+# Upper bounds in seconds for provider/cell latency histograms
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+class Histogram:
+    """
+    Thread-safe cumulative histogram with fixed bucket bounds
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value, times=1):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += times
+            self.count += times
+            self.sum += value * times
+
+    def quantile(self, q):
+        """
+        Estimate a quantile as the upper bound of the bucket that contains it
+        """
+        with self.lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            seen = 0
+            for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+                seen += count
+                if seen >= rank:
+                    return bound
+        return None
+
+    def snapshot(self):
+        with self.lock:
+            cumulative = []
+            seen = 0
+            for count in self.counts:
+                seen += count
+                cumulative.append(seen)
+            labels = [str(bound) for bound in self.buckets] + ['+Inf']
+            return {
+                'buckets': dict(zip(labels, cumulative)),
+                'count': self.count,
+                'sum': round(self.sum, 4)
+            }
+
+    def state(self):
+        with self.lock:
+            return list(self.counts), self.count, self.sum
+
+    def merge(self, state):
+        counts, count, total = state
+        with self.lock:
+            self.counts = [a + b for a, b in zip(self.counts, counts)]
+            self.count += count
+            self.sum += total
+
+class Value:
+    """
+    Thread-safe number used for counters and gauges
+    """
+
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        with self.lock:
+            self.value = value
+
+    def state(self):
+        return self.value
+
+    def merge(self, state):
+        self.inc(state)
+
+class Metric:
+    """
+    A named metric with one child per combination of label values
+    """
+
+    def __init__(self, name, documentation, kind, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.buckets = buckets
+        self.children = {}
+        self.lock = threading.Lock()
+        if not self.labelnames:
+            # Unlabeled metrics are exported even before their first update
+            self.labels()
+
+    def labels(self, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        child = self.children.get(key)
+        if child is None:
+            with self.lock:
+                child = self.children.get(key)
+                if child is None:
+                    child = Histogram(self.buckets) if self.kind == 'histogram' else Value()
+                    self.children[key] = child
+        return child
+
+    def render(self, remote=()):
+        """
+        Exposition lines, with the values exported by other processes (see
+        export) added to this process's own
+        """
+        children = dict(self.children)
+        for exported in remote:
+            for key, state in exported.get(self.name, {}).items():
+                child = Histogram(self.buckets) if self.kind == 'histogram' else Value()
+                if key in children:
+                    child.merge(children[key].state())
+                child.merge(state)
+                children[key] = child
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in sorted(children.items()):
+            labels = list(zip(self.labelnames, key))
+            if self.kind == 'histogram':
+                snapshot = child.snapshot()
+                for bound, count in snapshot['buckets'].items():
+                    lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', bound)])} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {snapshot['sum']}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {snapshot['count']}")
+            else:
+                lines.append(f"{self.name}{_format_labels(labels)} {_format_number(child.value)}")
+        return "\n".join(lines)
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels:
+        value = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+def _format_number(value):
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+REGISTRY = {}
+_registry_lock = threading.Lock()
+
+# Latest export() of other processes (the translation worker), by source name
+_remote = {}
+
+def _register(name, documentation, kind, labelnames=(), buckets=LATENCY_BUCKETS):
+    with _registry_lock:
+        if name not in REGISTRY:
+            REGISTRY[name] = Metric(name, documentation, kind, labelnames, buckets)
+        return REGISTRY[name]
+
+def counter(name, documentation, labelnames=()):
+    return _register(name, documentation, 'counter', labelnames)
+
+def gauge(name, documentation, labelnames=()):
+    return _register(name, documentation, 'gauge', labelnames)
+
+def histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+    return _register(name, documentation, 'histogram', labelnames, buckets)
+
+def render():
+    """
+    All registered metrics in the Prometheus text exposition format,
+    including those last exported by other processes
+    """
+    with _registry_lock:
+        metrics = list(REGISTRY.values())
+        remote = list(_remote.values())
+    return "\n".join(metric.render(remote) for metric in metrics) + "\n"
+
+def export():
+    """
+    State of every metric of this process, to be shipped to the process
+    serving /metrics and passed to set_remote there
+    """
+    with _registry_lock:
+        metrics = list(REGISTRY.values())
+    return {metric.name: {key: child.state() for key, child in list(metric.children.items())} for metric in metrics}
+
+def set_remote(source, exported):
+    """
+    Replace the metrics last exported by another process
+    """
+    with _registry_lock:
+        _remote[source] = exported
+
+# Buckets for workbook stages, which run from milliseconds to many minutes
+STAGE_BUCKETS = (0.05, 0.25, 1, 5, 15, 60, 300, 900, 3600)
+
+STAGE_SECONDS = histogram(
+    'translation_stage_seconds', 'Time spent in each stage of a workbook translation',
+    ('stage',), STAGE_BUCKETS
+)
+PROVIDER_REQUEST_SECONDS = histogram(
+    'provider_request_seconds', 'Latency of provider calls', ('provider', 'model')
+)
+PROVIDER_TOKENS = counter(
+    'provider_tokens_total', 'Estimated tokens sent to and received from providers',
+    ('provider', 'model', 'direction')
+)
+PROVIDER_ERRORS = counter(
+    'provider_errors_total', 'Failed provider calls by kind', ('provider', 'model', 'kind')
+)
+PROVIDER_RETRIES = counter(
+    'provider_retries_total', 'Provider calls retried after an error', ('provider', 'model', 'reason')
+)
+PROVIDER_ROUTES = counter(
+    'provider_routing_decisions_total', 'Requests sent by the provider router, by reason (primary, hedge, fallback)',
+    ('provider', 'model', 'reason')
+)
+
+class stage_timer:
+    """
+    Context manager that records the duration of a translation stage
+    """
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, *exc_info):
+        STAGE_SECONDS.labels(stage=self.stage).observe(time.monotonic() - self.start)
+        return False
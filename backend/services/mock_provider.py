@@ -0,0 +1,105 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+
+class MockProviderError(Exception):
+    """
+    Simulated provider failure; `status_code` drives the retry logic the same
+    way the real SDK errors do (429 = rate limit, 5xx = transient)
+    """
+
+    def __init__(self, status_code, message):
+        super().__init__(f"Error code: {status_code} - {message}")
+        self.status_code = status_code
+
+class MockProvider:
+    """
+    Offline stand-in for an LLM provider used by benchmarks and local runs.
+    Answers after a configurable latency, echoes every string back with a
+    "[mock]" prefix (keeping the JSON array shape of batched prompts) and can
+    inject errors and 429s. Everything is configured through MOCK_* variables.
+    """
+
+    def __init__(self, latency=None, jitter=None, seconds_per_token=None, error_rate=None,
+                 rate_limit_rate=None, requests_per_minute=None, seed=None):
+        self.latency = latency if latency is not None else float(os.getenv('MOCK_LATENCY', 0.2))
+        self.jitter = jitter if jitter is not None else float(os.getenv('MOCK_JITTER', 0.05))
+        self.seconds_per_token = (
+            seconds_per_token if seconds_per_token is not None
+            else float(os.getenv('MOCK_SECONDS_PER_TOKEN', 0.0005))
+        )
+        self.error_rate = error_rate if error_rate is not None else float(os.getenv('MOCK_ERROR_RATE', 0))
+        self.rate_limit_rate = (
+            rate_limit_rate if rate_limit_rate is not None
+            else float(os.getenv('MOCK_RATE_LIMIT_RATE', 0))
+        )
+        # Server-side request cap; requests over it get a 429 like a real provider
+        self.requests_per_minute = (
+            requests_per_minute if requests_per_minute is not None
+            else int(os.getenv('MOCK_SERVER_REQUESTS_PER_MINUTE', 0))
+        )
+        seed = seed if seed is not None else os.getenv('MOCK_SEED')
+        self.random = random.Random(seed)
+
+        self.lock = threading.Lock()
+        self.recent = deque()
+        self.calls = 0
+        self.errors = 0
+        self.rate_limited = 0
+
+    def complete(self, prompt, system_prompt=None, max_tokens=None):
+        self._simulate(prompt)
+        return self._answer(prompt, system_prompt)
+
+    def stream(self, prompt, system_prompt=None, max_tokens=None):
+        """
+        Yield the answer word by word, spreading the latency over the chunks
+        """
+        self._simulate(prompt, wait=False)
+        words = self._answer(prompt, system_prompt).split(' ')
+        delay = self._delay(prompt) / max(len(words), 1)
+        for i, word in enumerate(words):
+            time.sleep(delay)
+            yield word if i == 0 else ' ' + word
+
+    def stats(self):
+        with self.lock:
+            return {'calls': self.calls, 'errors': self.errors, 'rate_limited': self.rate_limited}
+
+    def _delay(self, prompt):
+        with self.lock:
+            jitter = self.random.uniform(-self.jitter, self.jitter)
+        return max(0.0, self.latency + jitter + self.seconds_per_token * len(prompt) / 4)
+
+    def _simulate(self, prompt, wait=True):
+        now = time.monotonic()
+        with self.lock:
+            self.calls += 1
+            while self.recent and now - self.recent[0] > 60:
+                self.recent.popleft()
+            over_limit = self.requests_per_minute and len(self.recent) >= self.requests_per_minute
+            if not over_limit:
+                self.recent.append(now)
+            roll = self.random.random()
+            if over_limit or roll < self.rate_limit_rate:
+                self.rate_limited += 1
+                raise MockProviderError(429, "rate limit exceeded")
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.errors += 1
+                raise MockProviderError(503, "service temporarily unavailable")
+        if wait:
+            time.sleep(self._delay(prompt))
+
+    @staticmethod
+    def _answer(prompt, system_prompt):
+        # Instructions come first and the payload follows the first blank line,
+        # unless the instructions were sent as the system prompt (groq style)
+        if system_prompt and 'JSON array' in system_prompt:
+            texts = json.loads(prompt.split('\n\n', 1)[1])
+            return json.dumps([f"[mock] {text}" for text in texts], ensure_ascii=False)
+        if system_prompt is None and '\n\n' in prompt:
+            prompt = prompt.split('\n\n', 1)[1]
+        return f"[mock] {prompt}"
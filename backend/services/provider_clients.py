@@ -0,0 +1,61 @@
+import os
+import threading
+
+# Keep-alive connections per provider, shared by every job in the process
+POOL_SIZE = int(os.getenv('PROVIDER_POOL_SIZE', 20))
+
+# Seconds an idle pooled connection is kept open
+KEEPALIVE_EXPIRY = float(os.getenv('PROVIDER_KEEPALIVE_EXPIRY', 60))
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def _http_client():
+    # httpx comes with the openai, anthropic and groq SDKs
+    import httpx
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=POOL_SIZE,
+            max_keepalive_connections=POOL_SIZE,
+            keepalive_expiry=KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(120.0, connect=10.0)
+    )
+
+def _create_client(provider):
+    # SDKs are imported here so only the providers actually used get loaded
+    if provider == "openai":
+        from openai import OpenAI
+        return OpenAI(api_key=os.getenv('OPENAI_API_KEY'), http_client=_http_client())
+
+    elif provider == "anthropic":
+        from anthropic import Anthropic
+        return Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'), http_client=_http_client())
+
+    elif provider == "groq":
+        from groq import Groq
+        return Groq(api_key=os.getenv('GROQ_API_KEY'), http_client=_http_client())
+
+    elif provider == "google":
+        import google.generativeai as genai
+        genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
+        return genai
+
+    elif provider == "mock":
+        from services.mock_provider import MockProvider
+        return MockProvider()
+
+    else:
+        raise ValueError(f"Unsupported provider: {provider}")
+
+def get_client(provider):
+    """
+    Return the process-wide client for a provider, creating it on first use
+    """
+    client = _clients.get(provider)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(provider)
+            if client is None:
+                client = _clients[provider] = _create_client(provider)
+    return client
@@ -0,0 +1,271 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# Provider name that lets the router pick provider and model per request
+AUTO_PROVIDER = "auto"
+
+# Latency/outcome samples kept per provider and model
+WINDOW_SIZE = int(os.getenv('ROUTER_WINDOW_SIZE', 200))
+
+# Samples needed before a provider's percentiles and error rate are trusted
+MIN_SAMPLES = int(os.getenv('ROUTER_MIN_SAMPLES', 20))
+
+# Threads running primary and hedged requests, shared by every job in the process
+ROUTER_WORKERS = int(os.getenv('ROUTER_WORKERS', 32))
+
+# How often a hedging wait checks whether the request has been sent yet
+HEDGE_POLL_SECONDS = 0.05
+
+# A provider is only routed to when its API key is set
+API_KEY_ENV = {
+    "openai": "OPENAI_API_KEY",
+    "anthropic": "ANTHROPIC_API_KEY",
+    "groq": "GROQ_API_KEY",
+    "google": "GOOGLE_API_KEY",
+}
+
+# Override any of these with ROUTING_POLICY, either inline JSON or the path of a JSON file
+DEFAULT_POLICY = {
+    # Send the same request to the next candidate once the first is this slow:
+    # seconds, or "p95" for the first candidate's own rolling p95
+    "hedge": True,
+    "hedge_after": "p95",
+    "hedge_min_seconds": 2.0,
+    "hedge_default_seconds": 20.0,
+    # On errors (after the usual retries) try the next candidate
+    "fallback": True,
+    # An explicitly chosen provider/model is only hedged or replaced when this
+    # is set, and then only by the provider's own models unless "cross_provider"
+    # is set too; "auto" always uses every provider
+    "explicit_fallback": False,
+    "cross_provider": False,
+    # Candidates failing more often than this, or slower than this p95, go to the back
+    "max_error_rate": 0.5,
+    "max_p95_seconds": 30.0,
+    # With provider "auto", requests whose longest cell has more estimated
+    # tokens than this use the strong tier, all others the fast one
+    "long_cell_tokens": 150,
+    # Candidates per tier, cheapest first
+    "tiers": {
+        "fast": [
+            ["groq", "llama-3.1-8b-instant"],
+            ["google", "gemini-1.5-flash"],
+            ["openai", "gpt-4o-mini"],
+            ["anthropic", "claude-3-5-haiku-20241022"],
+        ],
+        "strong": [
+            ["groq", "llama-3.3-70b-versatile"],
+            ["openai", "gpt-4o"],
+            ["google", "gemini-1.5-pro"],
+            ["anthropic", "claude-3-5-sonnet-20241022"],
+        ],
+    },
+}
+
+def load_policy():
+    """
+    DEFAULT_POLICY updated with the ROUTING_POLICY environment variable
+    """
+    policy = dict(DEFAULT_POLICY)
+    configured = os.getenv('ROUTING_POLICY')
+    if configured:
+        if os.path.isfile(configured):
+            with open(configured) as f:
+                configured = f.read()
+        policy.update(json.loads(configured))
+    return policy
+
+def provider_available(provider):
+    if provider == "mock":
+        return True
+    return bool(os.getenv(API_KEY_ENV.get(provider, ''), ''))
+
+class ProviderStats:
+    """
+    Rolling window of request latencies and outcomes for one provider/model
+    """
+
+    def __init__(self, size=WINDOW_SIZE):
+        self.samples = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def observe(self, seconds, ok):
+        with self.lock:
+            self.samples.append((seconds, ok))
+
+    def snapshot(self):
+        with self.lock:
+            samples = list(self.samples)
+        latencies = sorted(seconds for seconds, ok in samples if ok)
+
+        def percentile(q):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 3)
+
+        errors = sum(1 for _, ok in samples if not ok)
+        return {
+            'samples': len(samples),
+            'p50': percentile(0.5),
+            'p95': percentile(0.95),
+            'error_rate': round(errors / len(samples), 3) if samples else 0.0
+        }
+
+class ProviderRouter:
+    """
+    Picks the provider/model for each request and runs it with hedging and
+    fallback. Requests go to the first candidate; when it is slower than the
+    hedge deadline the next candidate gets the same request and whichever
+    answers first wins, and when it fails the next candidate takes over.
+    """
+
+    def __init__(self, policy=None):
+        self.policy = policy or load_policy()
+        self.stats = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=ROUTER_WORKERS, thread_name_prefix='router')
+
+    def provider_stats(self, provider, model):
+        key = (provider, model)
+        with self.lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = ProviderStats()
+            return stats
+
+    def observe(self, provider, model, seconds, ok):
+        self.provider_stats(provider, model).observe(seconds, ok)
+
+    def snapshot(self):
+        with self.lock:
+            keys = list(self.stats)
+        return {f"{provider}/{model}": self.provider_stats(provider, model).snapshot() for provider, model in keys}
+
+    def _demoted(self, candidate):
+        stats = self.provider_stats(*candidate).snapshot()
+        if stats['samples'] < MIN_SAMPLES:
+            return False
+        if stats['error_rate'] > self.policy['max_error_rate']:
+            return True
+        return stats['p95'] is not None and stats['p95'] > self.policy['max_p95_seconds']
+
+    def _rank(self, candidates):
+        # Stable sort keeps the configured cost order among healthy candidates
+        return sorted(candidates, key=self._demoted)
+
+    def _tier(self, name):
+        return [
+            (provider, model) for provider, model in self.policy['tiers'].get(name, [])
+            if provider_available(provider)
+        ]
+
+    def plan(self, provider, model, cell_tokens):
+        """
+        Ordered (provider, model) candidates for one request. An explicit
+        provider/model is used on its own unless the policy sets
+        "explicit_fallback"; "auto" starts with the tier for the cell size.
+        """
+        tier = 'strong' if cell_tokens > self.policy['long_cell_tokens'] else 'fast'
+        other = 'fast' if tier == 'strong' else 'strong'
+        candidates = self._rank(self._tier(tier)) + self._rank(self._tier(other))
+        candidates = list(dict.fromkeys(candidates))
+        if provider != AUTO_PROVIDER:
+            # Benchmarks on the mock provider never spill over to paid ones
+            if not (self.policy['fallback'] and self.policy['explicit_fallback']) or provider == "mock":
+                return [(provider, model)]
+            others = [c for c in candidates if c != (provider, model)]
+            if not self.policy['cross_provider']:
+                others = [c for c in others if c[0] == provider]
+            return [(provider, model)] + others
+        if not candidates:
+            raise ValueError("No provider with an API key is configured for automatic routing")
+        return candidates
+
+    def hedge_deadline(self, provider, model):
+        hedge_after = self.policy['hedge_after']
+        if hedge_after == 'p95':
+            stats = self.provider_stats(provider, model).snapshot()
+            if stats['samples'] >= MIN_SAMPLES and stats['p95'] is not None:
+                hedge_after = stats['p95']
+            else:
+                hedge_after = self.policy['hedge_default_seconds']
+        return max(float(hedge_after), self.policy['hedge_min_seconds'])
+
+    def execute(self, candidates, send, hedge=True, on_decision=None):
+        """
+        Run `send(provider, model, on_start)` over the candidates and return
+        (response, provider, model) of the first one that succeeds. `send`
+        calls `on_start()` when the request actually goes out (after waiting
+        for its rate limiter), and the hedge deadline counts from there.
+        Hedges go to a candidate of another provider, never to one sharing
+        the slow request's rate limiter (limiters are per provider).
+        `on_decision(provider, model, reason)` is called for every request
+        sent, with reason "primary", "hedge" or "fallback".
+        """
+        def decide(candidate, reason):
+            if on_decision:
+                on_decision(candidate[0], candidate[1], reason)
+
+        if len(candidates) == 1:
+            decide(candidates[0], 'primary')
+            return (send(*candidates[0], lambda: None),) + tuple(candidates[0])
+
+        hedge = hedge and self.policy['hedge']
+        queue = list(candidates)
+        pending = {}
+        errors = []
+
+        def launch(reason, index=0):
+            candidate = queue.pop(index)
+            decide(candidate, reason)
+            # Start time of the latest attempt, appended from the worker thread
+            started = []
+            future = self.executor.submit(send, *candidate, lambda: started.append(time.monotonic()))
+            pending[future] = (candidate, started)
+
+        launch('primary')
+        while pending:
+            timeout = None
+            hedge_index = None
+            # At most one hedge is in flight next to the slow request
+            if hedge and len(pending) == 1:
+                candidate, started = next(iter(pending.values()))
+                hedge_index = next((i for i, c in enumerate(queue) if c[0] != candidate[0]), None)
+                if hedge_index is not None:
+                    if started:
+                        timeout = max(0.0, started[-1] + self.hedge_deadline(*candidate) - time.monotonic())
+                    else:
+                        # Still waiting for its rate limiter or a worker
+                        timeout = HEDGE_POLL_SECONDS
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                if started and time.monotonic() >= started[-1] + self.hedge_deadline(*candidate):
+                    # The slow request keeps running; whichever answers first wins
+                    launch('hedge', hedge_index)
+                continue
+            for future in done:
+                candidate, _ = pending.pop(future)
+                try:
+                    return (future.result(),) + tuple(candidate)
+                except Exception as e:
+                    errors.append(e)
+            if not pending and queue and self.policy['fallback']:
+                launch('fallback')
+        raise errors[0]
+
+_router = None
+_router_lock = threading.Lock()
+
+def get_router():
+    """
+    Return the process-wide router, creating it on first use
+    """
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ProviderRouter()
+        return _router
@@ -0,0 +1,163 @@
+import os
+import threading
+import time
+
+# Conservative defaults based on each provider's entry-level tier.
+# Override with e.g. GROQ_REQUESTS_PER_MINUTE / GROQ_TOKENS_PER_MINUTE.
+PROVIDER_LIMITS = {
+    "groq": {"requests_per_minute": 30, "tokens_per_minute": 6000},
+    "openai": {"requests_per_minute": 500, "tokens_per_minute": 200000},
+    "anthropic": {"requests_per_minute": 50, "tokens_per_minute": 40000},
+    "google": {"requests_per_minute": 15, "tokens_per_minute": 1000000},
+    # Offline provider for benchmarks; its own 429s come from MOCK_SERVER_REQUESTS_PER_MINUTE
+    "mock": {"requests_per_minute": 100000, "tokens_per_minute": 100000000},
+}
+
+DEFAULT_LIMITS = {"requests_per_minute": 60, "tokens_per_minute": 60000}
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `rate_per_minute`
+    """
+
+    def __init__(self, rate_per_minute):
+        self.capacity = float(rate_per_minute)
+        self.rate_per_minute = float(rate_per_minute)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate_per_minute / 60.0)
+        self.updated_at = now
+
+    def take(self, amount=1):
+        """
+        Block until `amount` tokens are available, then consume them
+        """
+        # A single request larger than the bucket can never fit, cap it
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) * 60.0 / self.rate_per_minute
+            time.sleep(wait)
+
+    def set_rate(self, rate_per_minute):
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate_per_minute = max(float(rate_per_minute), 1.0)
+
+class ProviderRateLimiter:
+    """
+    Request and token budgets for one provider, with adaptive backoff.
+    Every 429 halves the request rate and pauses all callers; successful
+    calls slowly restore the configured rate.
+    """
+
+    MIN_BACKOFF = 1.0
+    MAX_BACKOFF = 60.0
+
+    def __init__(self, provider, requests_per_minute, tokens_per_minute):
+        self.provider = provider
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.current_rpm = float(requests_per_minute)
+        self.backoff = self.MIN_BACKOFF
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        # Honour any pause imposed by a recent 429
+        while True:
+            with self.lock:
+                wait = self.blocked_until - time.monotonic()
+            if wait <= 0:
+                break
+            time.sleep(wait)
+        self.requests.take(1)
+        self.tokens.take(tokens)
+
+    def on_success(self):
+        with self.lock:
+            self.backoff = self.MIN_BACKOFF
+            if self.current_rpm < self.requests_per_minute:
+                self.current_rpm = min(self.requests_per_minute, self.current_rpm * 1.1)
+                self.requests.set_rate(self.current_rpm)
+
+    def on_rate_limited(self, retry_after=None):
+        """
+        Record a 429 and return how long the caller should wait before retrying
+        """
+        with self.lock:
+            delay = retry_after if retry_after else self.backoff
+            self.backoff = min(self.backoff * 2, self.MAX_BACKOFF)
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+            self.current_rpm = max(1.0, self.current_rpm / 2)
+            self.requests.set_rate(self.current_rpm)
+            return delay
+
+def is_rate_limit_error(error):
+    """
+    Detect 429 / quota errors across the provider SDKs
+    """
+    if getattr(error, 'status_code', None) == 429:
+        return True
+    if type(error).__name__ in ('RateLimitError', 'ResourceExhausted', 'TooManyRequests'):
+        return True
+    message = str(error).lower()
+    return '429' in message or 'rate limit' in message or 'rate_limit' in message
+
+def is_transient_error(error):
+    """
+    Detect timeouts, dropped connections and 5xx/overloaded answers that are
+    worth retrying as-is
+    """
+    status = getattr(error, 'status_code', None)
+    if isinstance(status, int) and (status >= 500 or status in (408, 409)):
+        return True
+    if type(error).__name__ in (
+        'APITimeoutError', 'APIConnectionError', 'InternalServerError', 'ServiceUnavailable',
+        'DeadlineExceeded', 'TimeoutException', 'ConnectError', 'ReadError', 'RemoteProtocolError'
+    ):
+        return True
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    message = str(error).lower()
+    return 'overloaded' in message or 'timed out' in message or 'temporarily unavailable' in message
+
+def get_retry_after(error):
+    """
+    Read the Retry-After header from a provider error, if any
+    """
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(provider):
+    """
+    Return the process-wide rate limiter for a provider
+    """
+    with _limiters_lock:
+        if provider not in _limiters:
+            limits = PROVIDER_LIMITS.get(provider, DEFAULT_LIMITS)
+            prefix = (provider or "default").upper()
+            _limiters[provider] = ProviderRateLimiter(
+                provider,
+                int(os.getenv(f'{prefix}_REQUESTS_PER_MINUTE', limits['requests_per_minute'])),
+                int(os.getenv(f'{prefix}_TOKENS_PER_MINUTE', limits['tokens_per_minute']))
+            )
+        return _limiters[provider]
@@ -0,0 +1,143 @@
+import html
+import math
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+SHARED_STRINGS_PART = 'xl/sharedStrings.xml'
+
+# The parts are edited with targeted regular expressions rather than an XML
+# parser so that everything outside the replaced <t> text stays byte for byte.
+SI_PATTERN = re.compile(r'(<(?:\w+:)?si>)(.*?)(</(?:\w+:)?si>)', re.S)
+IS_PATTERN = re.compile(r'(<(?:\w+:)?is>)(.*?)(</(?:\w+:)?is>)', re.S)
+T_PATTERN = re.compile(r'<((?:\w+:)?t)(\s[^>]*?)?(?:/>|>(.*?)</(?:\w+:)?t>)', re.S)
+# Phonetic runs (furigana) also contain <t> elements but are not cell text
+PHONETIC_PATTERN = re.compile(r'<(?:\w+:)?rPh\b.*?</(?:\w+:)?rPh>', re.S)
+COUNT_PATTERN = re.compile(rb'<(?:\w+:)?sst\b[^>]*?\scount="(\d+)"')
+
+# Shards are cut where a string item (shared strings) or a row (worksheets) starts
+ITEM_PATTERNS = {'si': SI_PATTERN, 'is': IS_PATTERN}
+SHARD_BOUNDARIES = {
+    'si': re.compile(r'<(?:\w+:)?si>'),
+    'is': re.compile(r'<(?:\w+:)?row\b'),
+}
+
+def is_xlsx_package(file_path):
+    """
+    True if the file is an xlsx (OOXML) package that can be edited in place
+    """
+    if not zipfile.is_zipfile(file_path):
+        return False
+    with zipfile.ZipFile(file_path) as package:
+        return 'xl/workbook.xml' in package.namelist()
+
+def _split_phonetic(content):
+    """
+    Split item content into (is_phonetic, segment) pairs
+    """
+    segments = []
+    position = 0
+    for match in PHONETIC_PATTERN.finditer(content):
+        segments.append((False, content[position:match.start()]))
+        segments.append((True, match.group(0)))
+        position = match.end()
+    segments.append((False, content[position:]))
+    return segments
+
+def item_text(content):
+    """
+    Plain text of a string item, concatenating rich text runs
+    """
+    parts = []
+    for is_phonetic, segment in _split_phonetic(content):
+        if not is_phonetic:
+            parts.extend(html.unescape(m.group(3) or '') for m in T_PATTERN.finditer(segment))
+    return ''.join(parts)
+
+def _replace_item_text(content, translated_text):
+    # The translation goes into the first run so it keeps that run's formatting;
+    # the remaining runs are emptied. Phonetic runs no longer match the text and are dropped.
+    state = {'written': False}
+
+    def replace_t(match):
+        tag = match.group(1)
+        if state['written']:
+            return f'<{tag}/>'
+        state['written'] = True
+        return f'<{tag} xml:space="preserve">{escape(translated_text)}</{tag}>'
+
+    return ''.join(
+        '' if is_phonetic else T_PATTERN.sub(replace_t, segment)
+        for is_phonetic, segment in _split_phonetic(content)
+    )
+
+def extract_strings(xml, pattern=SI_PATTERN):
+    """
+    Text of every string item in document order
+    """
+    return [item_text(match.group(2)) for match in pattern.finditer(xml)]
+
+def replace_strings(xml, translate, pattern=SI_PATTERN):
+    """
+    Replace the text of every string item with `translate(text)`.
+    Items for which it returns None are left untouched.
+    """
+    def replace_item(match):
+        translated_text = translate(item_text(match.group(2)))
+        if translated_text is None:
+            return match.group(0)
+        return match.group(1) + _replace_item_text(match.group(2), translated_text) + match.group(3)
+
+    return pattern.sub(replace_item, xml)
+
+def reference_count(xml_bytes):
+    """
+    Number of cells pointing into the shared strings table, from the sst count attribute
+    """
+    match = COUNT_PATTERN.search(xml_bytes[:1024])
+    return int(match.group(1)) if match else None
+
+def inline_string_parts(package):
+    """
+    Worksheet parts that contain inline strings
+    """
+    return [
+        name for name in package.namelist()
+        if name.startswith('xl/worksheets/') and name.endswith('.xml')
+        and b'inlineStr' in package.read(name)
+    ]
+
+def rewrite_package(source_path, output_path, replacements):
+    """
+    Write a copy of an xlsx package with some parts replaced.
+    All other parts are copied unchanged, keeping entry order and compression.
+    """
+    with zipfile.ZipFile(source_path) as source, zipfile.ZipFile(output_path, 'w') as output:
+        for item in source.infolist():
+            data = replacements.get(item.filename)
+            if data is None:
+                data = source.read(item.filename)
+            output.writestr(item, data)
+
+def split_at_items(xml, kind, shards):
+    """
+    Split a part into at most `shards` consecutive chunks, cutting only at
+    item boundaries so every string item stays whole. Joining the chunks
+    gives back the original part.
+    """
+    if shards <= 1:
+        return [xml]
+    starts = [match.start() for match in SHARD_BOUNDARIES[kind].finditer(xml)]
+    if len(starts) < 2:
+        return [xml]
+    step = math.ceil(len(starts) / shards)
+    edges = [0] + starts[step::step] + [len(xml)]
+    return [xml[start:end] for start, end in zip(edges, edges[1:])]
+
+# Shard workers run in separate processes, so they only depend on this module
+
+def extract_shard(chunk, kind):
+    return extract_strings(chunk, ITEM_PATTERNS[kind])
+
+def replace_shard(chunk, kind, translations):
+    return replace_strings(chunk, translations.get, ITEM_PATTERNS[kind])
@@ -0,0 +1,85 @@
+import os
+import tempfile
+import time
+from flask import Request
+
+# Largest accepted upload; bigger requests get a 413 before anything is stored
+MAX_UPLOAD_BYTES = int(float(os.getenv('MAX_UPLOAD_MB', 200)) * 1024 * 1024)
+
+# Translated files are deleted this long after they were written...
+OUTPUT_TTL_SECONDS = int(os.getenv('OUTPUT_TTL_SECONDS', 24 * 3600))
+
+# ...or sooner, oldest first, once all outputs together exceed this size
+OUTPUT_QUOTA_BYTES = int(float(os.getenv('OUTPUT_QUOTA_MB', 2048)) * 1024 * 1024)
+
+# Spool files of uploads that never completed are removed after this long
+SPOOL_TTL_SECONDS = 3600
+
+SPOOL_PREFIX = 'upload_'
+SPOOL_SUFFIX = '.part'
+OUTPUT_PREFIX = 'translated_'
+
+class SpooledUploadRequest(Request):
+    """
+    Request that streams uploaded files straight into a spool file in the
+    upload folder, so saving them is a rename instead of another copy
+    """
+
+    upload_folder = 'uploads'
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.NamedTemporaryFile(
+            dir=self.upload_folder, prefix=SPOOL_PREFIX, suffix=SPOOL_SUFFIX, delete=False
+        )
+
+def save_upload(file, path):
+    """
+    Move an uploaded file to `path`, renaming its spool file when there is one
+    """
+    spool_path = getattr(file.stream, 'name', None)
+    if isinstance(spool_path, str) and os.path.exists(spool_path):
+        file.stream.flush()
+        os.replace(spool_path, path)
+        file.stream.close()
+    else:
+        file.save(path)
+
+def discard_upload(file):
+    spool_path = getattr(file.stream, 'name', None)
+    file.stream.close()
+    if isinstance(spool_path, str) and os.path.exists(spool_path):
+        os.remove(spool_path)
+
+def clean_uploads(directory, ttl=OUTPUT_TTL_SECONDS, quota=OUTPUT_QUOTA_BYTES, now=None):
+    """
+    Delete translated outputs older than `ttl`, then the oldest remaining ones
+    until they fit in `quota` bytes, plus abandoned upload spools.
+    Job inputs and databases are left alone. Returns the removed file names.
+    """
+    now = now or time.time()
+    removed = []
+    outputs = []
+    for entry in os.scandir(directory):
+        if not entry.is_file():
+            continue
+        stat = entry.stat()
+        age = now - stat.st_mtime
+        if entry.name.startswith(SPOOL_PREFIX) and entry.name.endswith(SPOOL_SUFFIX):
+            if age > SPOOL_TTL_SECONDS:
+                os.remove(entry.path)
+                removed.append(entry.name)
+        elif entry.name.startswith(OUTPUT_PREFIX):
+            if age > ttl:
+                os.remove(entry.path)
+                removed.append(entry.name)
+            else:
+                outputs.append((stat.st_mtime, stat.st_size, entry))
+
+    total = sum(size for _, size, _ in outputs)
+    for _, size, entry in sorted(outputs, key=lambda output: output[0]):
+        if total <= quota:
+            break
+        os.remove(entry.path)
+        removed.append(entry.name)
+        total -= size
+    return removed
@@ -0,0 +1,181 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# Expired entries are deleted, and the entry count recounted, at most this often
+PURGE_INTERVAL_SECONDS = int(os.getenv('TRANSLATION_MEMORY_PURGE_INTERVAL', 600))
+
+class TranslationMemory:
+    """
+    Persistent translation cache backed by an embedded SQLite database.
+    Entries are keyed by a hash of (text, source, target, provider, model),
+    expire after `ttl_seconds` and are evicted least-recently-used first
+    once the store grows past `max_entries`.
+    The entry count is kept as a running total, so writes never scan the
+    table; expired entries are purged every PURGE_INTERVAL_SECONDS.
+    """
+
+    # SQLite limits the number of bound parameters per statement
+    LOOKUP_CHUNK_SIZE = 500
+
+    def __init__(self, db_path=None, max_entries=None, ttl_seconds=None):
+        self.db_path = db_path or os.getenv('TRANSLATION_MEMORY_PATH', os.path.join('uploads', 'translation_memory.db'))
+        self.max_entries = max_entries or int(os.getenv('TRANSLATION_MEMORY_MAX_ENTRIES', 500000))
+        self.ttl_seconds = ttl_seconds or int(os.getenv('TRANSLATION_MEMORY_TTL', 30 * 24 * 3600))
+
+        # Counters since process start
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(self.db_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            "key TEXT PRIMARY KEY, "
+            "translation TEXT NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_translations_last_used ON translations (last_used)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_translations_created_at ON translations (created_at)")
+        self.conn.commit()
+        self.entries = self.conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        self.purged_at = 0
+
+    @staticmethod
+    def make_key(text, source_lang, target_lang, provider, model):
+        raw = "\x1f".join([text, source_lang or "", target_lang or "", provider or "", model or ""])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get_many(self, texts, source_lang, target_lang, provider, model):
+        """
+        Look up several texts at once. Returns a dict of text -> cached translation
+        for every text found; missing or expired entries are left out.
+        """
+        keys = {self.make_key(text, source_lang, target_lang, provider, model): text for text in texts}
+        if not keys:
+            return {}
+
+        now = time.time()
+        found = {}
+        key_list = list(keys)
+        with self.lock:
+            for i in range(0, len(key_list), self.LOOKUP_CHUNK_SIZE):
+                chunk = key_list[i:i + self.LOOKUP_CHUNK_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT key, translation FROM translations WHERE key IN ({placeholders}) AND created_at >= ?",
+                    (*chunk, now - self.ttl_seconds)
+                ).fetchall()
+                found.update(rows)
+
+            if found:
+                self.conn.executemany(
+                    "UPDATE translations SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self.conn.commit()
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+
+        return {keys[key]: translation for key, translation in found.items()}
+
+    def get(self, text, source_lang, target_lang, provider, model):
+        return self.get_many([text], source_lang, target_lang, provider, model).get(text)
+
+    def put_many(self, translations, source_lang, target_lang, provider, model):
+        """
+        Store a dict of text -> translation and enforce the size cap
+        """
+        if not translations:
+            return
+
+        now = time.time()
+        rows = [
+            (self.make_key(text, source_lang, target_lang, provider, model), translation, now, now)
+            for text, translation in translations.items()
+        ]
+        with self.lock:
+            existing = self._count_existing([row[0] for row in rows])
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO translations (key, translation, created_at, last_used) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self.entries += len(rows) - existing
+            if now - self.purged_at >= PURGE_INTERVAL_SECONDS:
+                self._purge(now)
+            self._evict()
+            self.conn.commit()
+
+    def put(self, text, translation, source_lang, target_lang, provider, model):
+        self.put_many({text: translation}, source_lang, target_lang, provider, model)
+
+    def _count_existing(self, keys):
+        count = 0
+        for i in range(0, len(keys), self.LOOKUP_CHUNK_SIZE):
+            chunk = keys[i:i + self.LOOKUP_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            count += self.conn.execute(
+                f"SELECT COUNT(*) FROM translations WHERE key IN ({placeholders})", chunk
+            ).fetchone()[0]
+        return count
+
+    def _purge(self, now):
+        # Drop expired entries and recount, which also picks up writes by other processes
+        cursor = self.conn.execute("DELETE FROM translations WHERE created_at < ?", (now - self.ttl_seconds,))
+        self.evictions += max(cursor.rowcount, 0)
+        self.entries = self.conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        self.purged_at = now
+
+    def _evict(self):
+        # Drop the least recently used entries over the cap
+        overflow = self.entries - self.max_entries
+        if overflow > 0:
+            cursor = self.conn.execute(
+                "DELETE FROM translations WHERE key IN "
+                "(SELECT key FROM translations ORDER BY last_used ASC LIMIT ?)",
+                (overflow,)
+            )
+            self.evictions += max(cursor.rowcount, 0)
+            self.entries -= max(cursor.rowcount, 0)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': self.entries,
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'size_bytes': os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0
+        }
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM translations")
+            self.conn.commit()
+            self.entries = 0
+
+_translation_memory = None
+_translation_memory_lock = threading.Lock()
+
+def get_translation_memory():
+    """
+    Return the process-wide translation memory, creating it on first use
+    """
+    global _translation_memory
+    with _translation_memory_lock:
+        if _translation_memory is None:
+            _translation_memory = TranslationMemory()
+        return _translation_memory
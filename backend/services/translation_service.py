@@ -1,199 +1,1136 @@
 import os
-from openai import OpenAI
-from anthropic import Anthropic
-from groq import Groq
-#from google.generativeai import GenerativeModel
-import google.generativeai as genai
 from dotenv import load_dotenv
+from services.provider_clients import get_client
+from services.translation_memory import get_translation_memory
+from services.cell_filter import CellFilter
+from services import metrics
+from services.metrics import Histogram, stage_timer
+from services.language_detection import detect_languages, language_code, language_name
+from services.rate_limiter import get_rate_limiter, is_rate_limit_error, is_transient_error, get_retry_after
+from services.checkpoints import get_checkpoint_store
+from services.provider_router import get_router, AUTO_PROVIDER
+from services.glossary import Glossary, PLACEHOLDER_PATTERN
+from services.formats import get_backend
+from services.job_history import get_job_history, content_hash
+from collections import Counter
+from services import shared_strings
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from copy import copy
+import json
+import logging
+import multiprocessing
+import re
+import threading
 import time
+import unicodedata
+import zipfile
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Model used when the caller doesn't pick one
+DEFAULT_MODELS = {
+    "openai": "gpt-3.5-turbo",
+    "anthropic": "claude-3-haiku-20240307",
+    "groq": "mixtral-8x7b-32768",
+    "google": "gemini-1.5-pro",
+    "mock": "mock",
+}
+
+# Number of provider calls in flight per translation job
+MAX_WORKERS = int(os.getenv('TRANSLATION_MAX_WORKERS', 4))
+
+# How many times a call is retried after the provider answers 429
+MAX_RATE_LIMIT_RETRIES = 5
+
+# Timeouts, dropped connections and 5xx answers are retried this many times,
+# waiting RETRY_BASE_DELAY seconds and doubling after each attempt
+MAX_TRANSIENT_RETRIES = int(os.getenv('MAX_TRANSIENT_RETRIES', 3))
+RETRY_BASE_DELAY = float(os.getenv('RETRY_BASE_DELAY', 1.0))
+
+# Completed translations of a job are checkpointed every this many strings
+CHECKPOINT_EVERY = int(os.getenv('CHECKPOINT_EVERY', 200))
+
+# Workbooks at least this large are translated with the streaming reader/writer
+STREAMING_THRESHOLD_BYTES = int(float(os.getenv('STREAMING_THRESHOLD_MB', 50)) * 1024 * 1024)
+
+# Rows read, translated and written together in streaming mode
+STREAMING_CHUNK_ROWS = int(os.getenv('STREAMING_CHUNK_ROWS', 2000))
+
+# Worker processes used to extract and rewrite large xlsx parts in shards
+SHARD_PROCESSES = int(os.getenv('TRANSLATION_PROCESSES', 1))
+
+# Parts smaller than this are not worth shipping to another process
+SHARD_MIN_BYTES = max(1, int(float(os.getenv('SHARD_MIN_MB', 8)) * 1024 * 1024))
+
+# Cells at least this long are sent on their own and streamed, pushing partial results
+STREAM_MIN_CHARS = int(os.getenv('STREAM_MIN_CHARS', 300))
+STREAM_PARTIAL_RESULTS = os.getenv('STREAM_PARTIAL_RESULTS', '1') == '1'
+
+# Minimum seconds between partial result events for one cell
+PARTIAL_INTERVAL = float(os.getenv('PARTIAL_INTERVAL', 0.25))
+
+# Batch strings per column and name the column header in the prompt (see translate_excel)
+COLUMN_CONTEXT = os.getenv('COLUMN_CONTEXT', '0') == '1'
+
+# Number of cells packed into one prompt and the estimated input tokens allowed per prompt
+DEFAULT_BATCH_SETTINGS = {"batch_size": 20, "token_budget": 1500}
+
+BATCH_SETTINGS = {
+    "openai": {"batch_size": 40, "token_budget": 3000},
+    "anthropic": {"batch_size": 40, "token_budget": 3000},
+    "groq": {"batch_size": 25, "token_budget": 2000},
+    "google": {"batch_size": 50, "token_budget": 4000},
+    "mock": {"batch_size": 40, "token_budget": 3000},
+}
+
+# Per-model overrides on top of the provider defaults
+MODEL_BATCH_SETTINGS = {
+    "llama3-8b-8192": {"batch_size": 15, "token_budget": 1200},
+    "gemma2-9b-it": {"batch_size": 15, "token_budget": 1200},
+    "claude-3-haiku-20240307": {"batch_size": 30, "token_budget": 2000},
+    "gpt-3.5-turbo": {"batch_size": 30, "token_budget": 2000},
+}
+
+def estimate_tokens(text):
+    """
+    Rough token estimate (about 4 characters per token)
+    """
+    return len(text) // 4 + 1
+
+def placeholder_note(text):
+    """
+    Prompt sentence asking to keep glossary placeholders, when the text has any
+    """
+    return " Keep placeholders such as ⟦0⟧ exactly as they are." if PLACEHOLDER_PATTERN.search(text) else ""
+
+def normalize_text(text):
+    """
+    Normalize a cell string so identical labels share one translation
+    """
+    return unicodedata.normalize("NFC", text.strip())
+
+def column_headers(sheet_title, values):
+    """
+    Context label of every column with a text header, by position in the row
+    """
+    return {
+        index: f"{sheet_title} / {normalize_text(value)}"
+        for index, value in enumerate(values)
+        if isinstance(value, str) and value.strip()
+    }
+
+def add_chunk_stats(totals, stats):
+    """
+    Add the stats of one chunk of a streamed file to the file's running totals
+    """
+    totals['total_cells'] += stats['cells']
+    totals['strings_translated'] += stats['translated']
+    for key in ('cache_hits', 'resumed', 'glossary_hits', 'reused', 'reused_cells', 'changed_cells'):
+        if key in stats:
+            totals[key] = totals.get(key, 0) + stats[key]
+    for rule, count in stats['skipped'].items():
+        totals['skipped'][rule] = totals['skipped'].get(rule, 0) + count
+
+def target_language_list(target_language):
+    """
+    Target languages given as one language, a comma separated string or a list
+    """
+    if isinstance(target_language, str):
+        target_language = target_language.split(',')
+    return list(dict.fromkeys(language.strip() for language in target_language if language and language.strip()))
+
+def language_stats(results):
+    """
+    Resolve stats of a single-language run, or the stats of every language
+    """
+    if len(results) == 1:
+        return next(iter(results.values()))[1]
+    return {'languages': {language: stats for language, (_, stats) in results.items()}}
+
+def parse_json_array(response):
+    """
+    Extract a JSON array from a model response, ignoring code fences or
+    surrounding chatter. Returns None if no valid array is found.
+    """
+    response = re.sub(r"^```(?:json)?|```$", "", response.strip()).strip()
+    start = response.find('[')
+    end = response.rfind(']')
+    if start == -1 or end <= start:
+        return None
+    try:
+        parsed = json.loads(response[start:end + 1])
+    except ValueError:
+        return None
+    return parsed if isinstance(parsed, list) else None
+
+class BatchTranslationError(Exception):
+    """
+    Raised when a batch fails; `text` is the first string of the failed batch
+    """
+
+    def __init__(self, text, error):
+        super().__init__(str(error))
+        self.text = text
+        self.error = error
+
 class TranslationService:
-    def __init__(self):
-        # Initialize AI providers with API keys from environment variables
-        self.openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-        self.anthropic_client = Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
-        self.groq_client = Groq(api_key=os.getenv('GROQ_API_KEY'))
+    def __init__(self, memory=None, cell_filter=None, checkpoints=None):
+        # Provider clients are created lazily and shared process-wide (see provider_clients)
         
-        # Initialize Google AI
-        genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
+        # Persistent translation memory shared by all jobs in the process
+        self.memory = memory if memory is not None else get_translation_memory()
+        
+        # Pre-filter for cells that never need translating
+        self.cell_filter = cell_filter or CellFilter()
+        
+        # Per-job checkpoints, only used when translate_excel gets a job_id
+        self.checkpoints = checkpoints
+        self.job_id = None
         
         # Initialize progress callback
         self.progress_callback = None
+        
+        # Provider latency attributed to every cell of the batch it was sent in
+        self.cell_latency = Histogram()
+
+        # Provider requests of this job by "provider/model" and routing reason
+        self.routing = {}
+        self.stats_lock = threading.Lock()
+
+        # Prompt tokens sent, against what one prompt per cell would have cost
+        self.token_usage = {'requests': 0, 'prompt_tokens': 0, 'unbatched_prompt_tokens': 0}
+
+        # Per-job term map and the column header of each string, set by translate_excel
+        self.glossary = None
+        self.contexts = {}
+
+        # Earlier job or file pair whose translations are reused, and their manifests by language
+        self.previous_job_id = None
+        self.previous_files = None
+        self.previous = {}
+        self.previous_lock = threading.Lock()
 
     def set_progress_callback(self, callback):
         self.progress_callback = callback
 
-    def update_progress(self, current, total, message=""):
+    def update_progress(self, current, total, message="", **stats):
         if self.progress_callback:
+            if self.cell_latency.count:
+                stats.setdefault('cell_latency', self.cell_latency.snapshot())
+            if self.routing:
+                with self.stats_lock:
+                    stats.setdefault('routing', {key: dict(counts) for key, counts in self.routing.items()})
+            if self.token_usage['requests']:
+                with self.stats_lock:
+                    usage = dict(self.token_usage)
+                usage['saved_tokens'] = usage['unbatched_prompt_tokens'] - usage['prompt_tokens']
+                stats.setdefault('token_usage', usage)
             progress = int((current / total) * 100) if total > 0 else 0
             self.progress_callback({
                 "progress": progress,
-                "message": message
+                "message": message,
+                **stats
             })
 
-    def translate(self, text, source_lang, target_lang, provider="groq", model=None):
-        prompt = f"Translate the following text from {source_lang} to {target_lang}. Preserve any special characters, numbers, and formatting. Only return the translated text, without any explanations:\n\n{text}"
+    def translate(self, text, source_lang, target_lang, provider="groq", model=None, on_token=None, on_attempt=None):
+        """
+        Translate a single text. With `on_token`, the provider response is
+        streamed and `on_token(chunk)` is called for every piece as it arrives.
+        `on_attempt()` is called before every attempt (retry or fallback), when
+        the pieces streamed so far are to be discarded.
+        """
+        model = model or DEFAULT_MODELS.get(provider)
+        for cache_provider, cache_model in self.cache_keys(provider, model):
+            cached = self.memory.get(text, source_lang, target_lang, cache_provider, cache_model)
+            if cached is not None:
+                return cached
+        
+        translated_text, provider, model = self._translate_uncached(
+            text, source_lang, target_lang, provider=provider, model=model, on_token=on_token, on_attempt=on_attempt
+        )
+        self.memory.put(text, translated_text, source_lang, target_lang, provider, model)
+        return translated_text
+
+    def cache_keys(self, provider, model):
+        """
+        (provider, model) pairs whose translation memory entries serve a
+        request: the one asked for, or every routing candidate for "auto".
+        Entries are always stored under the provider/model that answered.
+        """
+        if provider != AUTO_PROVIDER:
+            return [(provider, model)]
+        return get_router().plan(provider, model, 0)
+
+    def single_prompt(self, text, source_lang, target_lang):
+        return (
+            f"Translate the following text from {source_lang} to {target_lang}. "
+            f"Preserve any special characters, numbers, and formatting.{placeholder_note(text)} "
+            f"Only return the translated text, without any explanations:\n\n{text}"
+        )
+
+    def _translate_uncached(self, text, source_lang, target_lang, provider="groq", model=None, on_token=None, on_attempt=None):
+        """
+        Translate a single text without the translation memory.
+        Returns (translation, provider, model) of the provider that answered.
+        """
+        prompt = self.single_prompt(text, source_lang, target_lang)
         
         try:
-            if provider == "openai":
-                response = self.openai_client.chat.completions.create(
-                    model=model or "gpt-3.5-turbo",
-                    messages=[{"role": "user", "content": prompt}]
+            if provider == "groq":
+                return self._complete(
+                    text,
+                    provider=provider,
+                    model=model,
+                    system_prompt=f"You are a professional translator. Translate from {source_lang} to {target_lang}.{placeholder_note(text)}",
+                    on_token=on_token,
+                    on_attempt=on_attempt,
+                    cell_tokens=estimate_tokens(text)
                 )
-                return response.choices[0].message.content.strip()
-            
-            elif provider == "anthropic":
-                response = self.anthropic_client.messages.create(
-                    model=model or "claude-3-haiku-20240307",
-                    max_tokens=1000,
-                    messages=[{"role": "user", "content": prompt}]
-                )
-                return response.content[0].text.strip()
-            
-            elif provider == "groq":
-                response = self.groq_client.chat.completions.create(
-                    model=model or "mixtral-8x7b-32768",
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": f"You are a professional translator. Translate from {source_lang} to {target_lang}."
-                        },
-                        {
-                            "role": "user",
-                            "content": text
-                        }
-                    ],
-                    temperature=1,
-                    max_tokens=1024,
-                    top_p=1,
-                    stream=False
-                )
-                return response.choices[0].message.content.strip()
-            
-            elif provider == "google":
-                model = GenerativeModel(model or "gemini-1.5-pro")
-                response = model.generate_content(prompt)
-                return response.text.strip()
-            
-            else:
-                raise ValueError(f"Unsupported provider: {provider}")
+            return self._complete(
+                prompt, provider=provider, model=model, on_token=on_token, on_attempt=on_attempt, cell_tokens=estimate_tokens(text)
+            )
                 
         except Exception as e:
             raise Exception(f"Translation error: {str(e)}")
 
-    def translate_excel(self, file_path, target_language, provider="groq", model=None):
+    def _complete(self, prompt, provider="groq", model=None, system_prompt=None, max_tokens=None, on_token=None, on_attempt=None, cell_tokens=None):
+        """
+        Send a single prompt through the provider router, which picks the
+        provider/model ("auto"), hedges slow requests and falls back on errors.
+        `on_attempt()` is called as every attempt starts, retries and fallbacks included.
+        `cell_tokens` is the estimated size of the longest cell in the prompt.
+        Returns (response, provider, model) of the candidate that answered.
+        """
+        router = get_router()
+        model = model or DEFAULT_MODELS.get(provider)
+        with self.stats_lock:
+            self.token_usage['requests'] += 1
+            self.token_usage['prompt_tokens'] += estimate_tokens(prompt + (system_prompt or ""))
+        if cell_tokens is None:
+            cell_tokens = estimate_tokens(prompt)
+        candidates = router.plan(provider, model, cell_tokens)
+
+        def send(provider, model, on_start):
+            def started():
+                on_start()
+                if on_attempt:
+                    on_attempt()
+            return self._send(prompt, provider, model, system_prompt, max_tokens, on_token, started)
+
+        # Streamed tokens can't be interleaved from two providers, so those are never hedged
+        return router.execute(candidates, send, hedge=on_token is None, on_decision=self._record_route)
+
+    def _record_route(self, provider, model, reason):
+        metrics.PROVIDER_ROUTES.labels(provider=provider, model=model or '', reason=reason).inc()
+        key = f"{provider}/{model}"
+        with self.stats_lock:
+            counts = self.routing.setdefault(key, {})
+            counts[reason] = counts.get(reason, 0) + 1
+
+    def _send(self, prompt, provider, model, system_prompt=None, max_tokens=None, on_token=None, on_start=None):
+        """
+        Send a single prompt to one provider through its rate limiter, backing
+        off and retrying when the provider answers 429 or fails transiently.
+        `on_start()` is called whenever an attempt gets past the rate limiter.
+        """
+        limiter = get_rate_limiter(provider)
+        router = get_router()
+        labels = {'provider': provider, 'model': model or DEFAULT_MODELS.get(provider, '')}
+        prompt_tokens = estimate_tokens(prompt + (system_prompt or ""))
+        # Budget for the prompt plus a response of similar size
+        tokens = 2 * prompt_tokens
+        attempt = 0
+        transient_attempt = 0
+        while True:
+            limiter.acquire(tokens)
+            if on_start:
+                on_start()
+            metrics.PROVIDER_TOKENS.labels(direction='in', **labels).inc(prompt_tokens)
+            start = time.monotonic()
+            try:
+                if on_token:
+                    response = self._request_stream(prompt, provider, model, system_prompt, max_tokens, on_token)
+                else:
+                    response = self._request(prompt, provider, model, system_prompt, max_tokens)
+            except Exception as e:
+                metrics.PROVIDER_REQUEST_SECONDS.labels(**labels).observe(time.monotonic() - start)
+                router.observe(provider, model, time.monotonic() - start, False)
+                if is_rate_limit_error(e):
+                    kind = 'rate_limit'
+                elif is_transient_error(e):
+                    kind = 'transient'
+                else:
+                    kind = 'other'
+                metrics.PROVIDER_ERRORS.labels(kind=kind, **labels).inc()
+                if kind == 'rate_limit' and attempt < MAX_RATE_LIMIT_RETRIES:
+                    attempt += 1
+                    metrics.PROVIDER_RETRIES.labels(reason=kind, **labels).inc()
+                    time.sleep(limiter.on_rate_limited(get_retry_after(e)))
+                    continue
+                if kind == 'transient' and transient_attempt < MAX_TRANSIENT_RETRIES:
+                    metrics.PROVIDER_RETRIES.labels(reason=kind, **labels).inc()
+                    time.sleep(RETRY_BASE_DELAY * 2 ** transient_attempt)
+                    transient_attempt += 1
+                    continue
+                raise
+            metrics.PROVIDER_REQUEST_SECONDS.labels(**labels).observe(time.monotonic() - start)
+            router.observe(provider, model, time.monotonic() - start, True)
+            metrics.PROVIDER_TOKENS.labels(direction='out', **labels).inc(estimate_tokens(response or ""))
+            limiter.on_success()
+            return response
+
+    def _request(self, prompt, provider="groq", model=None, system_prompt=None, max_tokens=None):
+        """
+        Send a single prompt to the given provider and return the response text
+        """
+        if provider == "openai":
+            messages = [{"role": "user", "content": prompt}]
+            if system_prompt:
+                messages.insert(0, {"role": "system", "content": system_prompt})
+            kwargs = {"max_tokens": max_tokens} if max_tokens else {}
+            response = get_client("openai").chat.completions.create(
+                model=model or DEFAULT_MODELS["openai"],
+                messages=messages,
+                **kwargs
+            )
+            return response.choices[0].message.content.strip()
+        
+        elif provider == "anthropic":
+            kwargs = {"system": system_prompt} if system_prompt else {}
+            response = get_client("anthropic").messages.create(
+                model=model or DEFAULT_MODELS["anthropic"],
+                max_tokens=max_tokens or 1000,
+                messages=[{"role": "user", "content": prompt}],
+                **kwargs
+            )
+            return response.content[0].text.strip()
+        
+        elif provider == "groq":
+            messages = [{"role": "user", "content": prompt}]
+            if system_prompt:
+                messages.insert(0, {"role": "system", "content": system_prompt})
+            response = get_client("groq").chat.completions.create(
+                model=model or DEFAULT_MODELS["groq"],
+                messages=messages,
+                temperature=1,
+                max_tokens=max_tokens or 1024,
+                top_p=1,
+                stream=False
+            )
+            return response.choices[0].message.content.strip()
+        
+        elif provider == "google":
+            generative_model = get_client("google").GenerativeModel(model or DEFAULT_MODELS["google"])
+            if system_prompt:
+                prompt = f"{system_prompt}\n\n{prompt}"
+            response = generative_model.generate_content(prompt)
+            return response.text.strip()
+        
+        elif provider == "mock":
+            return get_client("mock").complete(prompt, system_prompt, max_tokens).strip()
+        
+        else:
+            raise ValueError(f"Unsupported provider: {provider}")
+
+    def _request_stream(self, prompt, provider, model, system_prompt, max_tokens, on_token):
+        """
+        Like _request, but streams the response and calls `on_token(chunk)`
+        for every text chunk as it arrives. Returns the full response text.
+        """
+        chunks = []
+
+        def emit(chunk):
+            if chunk:
+                chunks.append(chunk)
+                on_token(chunk)
+
+        if provider in ("openai", "groq"):
+            messages = [{"role": "user", "content": prompt}]
+            if system_prompt:
+                messages.insert(0, {"role": "system", "content": system_prompt})
+            kwargs = {"max_tokens": max_tokens} if max_tokens else {}
+            if provider == "groq":
+                kwargs = {"temperature": 1, "max_tokens": max_tokens or 1024, "top_p": 1}
+            stream = get_client(provider).chat.completions.create(
+                model=model or DEFAULT_MODELS[provider],
+                messages=messages,
+                stream=True,
+                **kwargs
+            )
+            for event in stream:
+                if event.choices:
+                    emit(event.choices[0].delta.content)
+
+        elif provider == "anthropic":
+            kwargs = {"system": system_prompt} if system_prompt else {}
+            with get_client("anthropic").messages.stream(
+                model=model or DEFAULT_MODELS["anthropic"],
+                max_tokens=max_tokens or 1000,
+                messages=[{"role": "user", "content": prompt}],
+                **kwargs
+            ) as stream:
+                for text in stream.text_stream:
+                    emit(text)
+
+        elif provider == "google":
+            generative_model = get_client("google").GenerativeModel(model or DEFAULT_MODELS["google"])
+            if system_prompt:
+                prompt = f"{system_prompt}\n\n{prompt}"
+            for event in generative_model.generate_content(prompt, stream=True):
+                emit(event.text)
+
+        elif provider == "mock":
+            for chunk in get_client("mock").stream(prompt, system_prompt, max_tokens):
+                emit(chunk)
+
+        else:
+            raise ValueError(f"Unsupported provider: {provider}")
+
+        return "".join(chunks).strip()
+
+    def get_batch_settings(self, provider="groq", model=None, batch_size=None, token_budget=None):
+        """
+        Resolve batch size and token budget for a provider/model.
+        Explicit arguments win over model overrides, which win over provider defaults.
+        """
+        settings = dict(BATCH_SETTINGS.get(provider, DEFAULT_BATCH_SETTINGS))
+        settings.update(MODEL_BATCH_SETTINGS.get(model, {}))
+        if batch_size:
+            settings['batch_size'] = batch_size
+        if token_budget:
+            settings['token_budget'] = token_budget
+        return settings
+
+    def pack_batches(self, texts, batch_size, token_budget):
+        """
+        Group text indices into batches that respect both the cell count
+        and the estimated token budget. Oversized texts get a batch of their own.
+        """
+        batches = []
+        current = []
+        current_tokens = 0
+        for idx, text in enumerate(texts):
+            tokens = estimate_tokens(text)
+            if current and (len(current) >= batch_size or current_tokens + tokens > token_budget):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(idx)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def translate_batch(self, texts, source_lang, target_lang, provider="groq", model=None, token_budget=None, context=None):
+        """
+        Translate several texts with a single provider call, bypassing the
+        translation memory (callers look up and store results in bulk).
+        `context` names the column the texts come from and goes into the prompt.
+        Returns a list of translations in the same order as `texts`. Any entry
+        missing or mangled in the batched response is retried on its own.
+        """
+        return [
+            translation for translation, _, _ in
+            self._translate_batch(texts, source_lang, target_lang, provider, model, token_budget, context)
+        ]
+
+    def _translate_batch(self, texts, source_lang, target_lang, provider="groq", model=None, token_budget=None, context=None):
+        # translate_batch, returning (translation, provider, model) per text
+        if not texts:
+            return []
+        if len(texts) == 1:
+            return [self._translate_uncached(texts[0], source_lang, target_lang, provider=provider, model=model)]
+
+        payload = json.dumps(texts, ensure_ascii=False)
+        context_note = f"The strings are values of the spreadsheet column \"{context}\", translate them consistently. " if context else ""
+        prompt = (
+            f"Translate each string in the following JSON array from {source_lang} to {target_lang}. "
+            f"{context_note}Preserve any special characters, numbers, and formatting.{placeholder_note(payload)} "
+            f"Return only a JSON array containing exactly {len(texts)} translated strings in the same order, "
+            f"without any explanations:\n\n{payload}"
+        )
+        # Translations are roughly as long as the source, leave room for JSON overhead
+        max_tokens = max(1024, 2 * (token_budget or sum(estimate_tokens(t) for t in texts)))
+
+        results = [None] * len(texts)
+        try:
+            response, answered_provider, answered_model = self._complete(
+                prompt,
+                provider=provider,
+                model=model,
+                system_prompt="You are a professional translator. You always answer with a valid JSON array of strings.",
+                max_tokens=max_tokens,
+                cell_tokens=max(estimate_tokens(t) for t in texts)
+            )
+        except Exception as e:
+            # The provider already retried and fell back; one call per cell would only fail the same way
+            raise Exception(f"Translation error: {str(e)}")
+        parsed = parse_json_array(response)
+        # Only trust positions if the counts line up
+        if parsed is not None and len(parsed) == len(texts):
+            for idx, value in enumerate(parsed):
+                if isinstance(value, str) and value.strip():
+                    results[idx] = (value.strip(), answered_provider, answered_model)
+
+        # Retry missing or mangled cells individually
+        for idx, value in enumerate(results):
+            if value is None:
+                results[idx] = self._translate_uncached(texts[idx], source_lang, target_lang, provider=provider, model=model)
+
+        return results
+
+    def iter_translated_batches(self, texts, target_language, provider, model, batch_settings, max_workers=None, source_languages=None):
+        """
+        Translate unique texts in batches with several provider calls in flight.
+        `source_languages` maps texts to a known source language; batches never
+        mix languages and unknown ones are sent as "auto". Without it, every
+        batch detects its own languages on its worker thread (see _run_batch),
+        so the first batches go out without waiting for the whole set.
+        Yields a dict of text -> translation for each batch as it completes and
+        stores it in the translation memory under the provider/model that answered.
+        Strings detected to be in the target language already map to None.
+        """
+        groups = {}
+        long_texts = []
+        stream_partials = STREAM_PARTIAL_RESULTS and self.progress_callback is not None
+        for text in texts:
+            source_lang = source_languages.get(text) or "auto" if source_languages is not None else None
+            if stream_partials and len(text) >= STREAM_MIN_CHARS:
+                # Long cells go alone so their translation can be streamed
+                long_texts.append((source_lang, None, [text]))
+            else:
+                # With column context, strings under one header share their batches
+                groups.setdefault((source_lang, self.contexts.get(text)), []).append(text)
+
+        jobs = list(long_texts)
+        for (source_lang, context), group in groups.items():
+            for batch in self.pack_batches(group, batch_settings['batch_size'], batch_settings['token_budget']):
+                jobs.append((source_lang, context, [group[i] for i in batch]))
+
+        with ThreadPoolExecutor(max_workers=max_workers or MAX_WORKERS) as executor:
+            futures = {}
+            for source_lang, context, batch_texts in jobs:
+                future = executor.submit(
+                    self._run_batch,
+                    batch_texts,
+                    source_lang,
+                    target_language,
+                    provider,
+                    model,
+                    batch_settings['token_budget'],
+                    context
+                )
+                futures[future] = batch_texts
+            for future in as_completed(futures):
+                batch_texts = futures[future]
+                try:
+                    translated_texts = future.result()
+                except Exception as e:
+                    for pending in futures:
+                        pending.cancel()
+                    raise BatchTranslationError(batch_texts[0], e)
+
+                answered = {}
+                for text, (translation, answered_provider, answered_model) in zip(batch_texts, translated_texts):
+                    if translation is not None:
+                        answered.setdefault((answered_provider, answered_model), {})[text] = translation
+                for (answered_provider, answered_model), translations in answered.items():
+                    self.memory.put_many(translations, "auto", target_language, answered_provider, answered_model)
+                yield {text: translation for text, (translation, _, _) in zip(batch_texts, translated_texts)}
+
+    def _run_batch(self, texts, source_lang, target_language, provider, model, token_budget, context=None):
+        """
+        Translate one batch on a worker thread and record per-cell latency.
+        A long cell on its own is streamed so partial results reach the progress stream.
+        With `source_lang` None the batch's languages are detected first: strings
+        already in the target language are not sent, and the rest go out with
+        their common source language, or "auto" when they differ or are unknown.
+        Returns (translation, provider, model) per text, (None, None, None) for
+        strings in the target language.
+        """
+        if source_lang is None:
+            codes = detect_languages(texts)
+            target_code = language_code(target_language)
+            send = [text for text in texts if not codes[text] or language_code(codes[text]) != target_code]
+            detected = {codes[text] for text in send}
+            source_lang = language_name(detected.pop()) if len(detected) == 1 and None not in detected else "auto"
+            if len(send) < len(texts):
+                translated = {}
+                if send:
+                    translated = dict(zip(send, self._run_batch(send, source_lang, target_language, provider, model, token_budget, context)))
+                return [translated.get(text, (None, None, None)) for text in texts]
+
+        unbatched_tokens = sum(estimate_tokens(self.single_prompt(text, source_lang, target_language)) for text in texts)
+        with self.stats_lock:
+            self.token_usage['unbatched_prompt_tokens'] += unbatched_tokens
+        start = time.monotonic()
+        if len(texts) == 1 and len(texts[0]) >= STREAM_MIN_CHARS and STREAM_PARTIAL_RESULTS and self.progress_callback:
+            on_token, on_attempt = self._partial_reporter(texts[0])
+            translated_texts = [self._translate_uncached(
+                texts[0], source_lang, target_language, provider=provider, model=model,
+                on_token=on_token, on_attempt=on_attempt
+            )]
+            self.report_partial(texts[0], translated_texts[0][0], done=True)
+        else:
+            translated_texts = self._translate_batch(
+                texts,
+                source_lang=source_lang,
+                target_lang=target_language,
+                provider=provider,
+                model=model,
+                token_budget=token_budget,
+                context=context
+            )
+        self.cell_latency.observe(time.monotonic() - start, times=len(texts))
+        return translated_texts
+
+    def _partial_reporter(self, text):
+        """
+        Token callback that forwards the translation so far, at most every
+        PARTIAL_INTERVAL seconds, and the attempt callback that starts it over
+        when a request is retried or falls back. Returns (on_token, on_attempt).
+        """
+        chunks = []
+        last_sent = [0.0]
+
+        def on_token(chunk):
+            chunks.append(chunk)
+            now = time.monotonic()
+            if now - last_sent[0] >= PARTIAL_INTERVAL:
+                last_sent[0] = now
+                self.report_partial(text, "".join(chunks))
+
+        def on_attempt():
+            if chunks:
+                chunks.clear()
+                self.report_partial(text, "")
+
+        return on_token, on_attempt
+
+    def report_partial(self, text, translated_so_far, done=False):
+        if self.progress_callback:
+            self.progress_callback({
+                "partial": {
+                    "source": text[:200],
+                    "translation": translated_so_far,
+                    "done": done
+                }
+            })
+
+    def previous_translations(self, target_language):
+        """
+        Manifest (content hash -> translation) of the previous job or file pair
+        for a target language, loaded once; empty without one
+        """
+        if not (self.previous_job_id or self.previous_files):
+            return {}
+        key = language_code(target_language)
+        with self.previous_lock:
+            if key not in self.previous:
+                if self.previous_files:
+                    self.previous[key] = self.manifest_from_files(*self.previous_files)
+                else:
+                    self.previous[key] = get_job_history().load(self.previous_job_id, key)
+            return self.previous[key]
+
+    def manifest_from_files(self, source_path, output_path):
+        """
+        Manifest of an earlier version of a file and its translation: both are
+        read side by side and each source string is paired with the value at
+        the same position in the output
+        """
+        manifest = {}
+        sheet_pairs = zip(get_backend(source_path).sheets(), get_backend(output_path).sheets())
+        for (_, source_rows), (_, output_rows) in sheet_pairs:
+            for source_row, output_row in zip(source_rows, output_rows):
+                for source_value, output_value in zip(source_row, output_row):
+                    if isinstance(source_value, str) and source_value.strip() and isinstance(output_value, str):
+                        manifest.setdefault(content_hash(normalize_text(source_value)), output_value)
+        return manifest
+
+    def diff_stats(self, cell_counts, target_languages):
+        """
+        Cells whose string is in the previous manifest (reused) and changed or
+        new ones, summed over the target languages. `cell_counts` maps each
+        unique string to the number of cells using it.
+        """
+        stats = {'reused_cells': 0, 'changed_cells': 0}
+        for language in target_languages:
+            previous = self.previous_translations(language)
+            for text, count in cell_counts.items():
+                stats['reused_cells' if content_hash(text) in previous else 'changed_cells'] += count
+        return stats
+
+    def resolve_translations(self, texts, target_language, provider, model, batch_settings, max_workers=None, on_progress=None):
+        """
+        Translate unique normalized texts. Non-linguistic strings (numbers,
+        dates, codes...) are passed through by the cell filter and left out of
+        the result, the translation memory is checked next. The remaining
+        strings go out in concurrent batches, each language-detected on its
+        worker thread: strings already in the target language are skipped too,
+        and the rest are sent with their detected source language. `on_progress(done_texts)` is
+        called after the filter/cache pass and after every batch.
+        When the service runs for a job, strings checkpointed by an earlier
+        attempt are reused and new results are checkpointed every CHECKPOINT_EVERY strings.
+        With a glossary, strings that are a glossary term get its target
+        directly and terms inside the others become placeholders first (see
+        services/glossary.py), so memory and checkpoints hold the placeholder form.
+        With a previous job or file pair (see translate_excel), strings whose
+        content hash is in its manifest reuse the earlier translation. When the
+        service runs for a job, every string goes into the job's own manifest,
+        the passed-through ones mapped to themselves, so an unchanged re-run
+        reuses them all.
+        Returns (translations, stats) with cache hits and skip counts per rule.
+        """
+        all_texts = texts
+        reused = {}
+        previous = self.previous_translations(target_language)
+        if previous:
+            for text in texts:
+                translation = previous.get(content_hash(text))
+                if translation is not None:
+                    reused[text] = translation
+            texts = [text for text in texts if text not in reused]
+            if on_progress and reused:
+                on_progress(list(reused))
+
+        if self.glossary:
+            translations, stats = self._resolve_glossary(texts, target_language, provider, model, batch_settings, max_workers, on_progress)
+        else:
+            translations, stats = self._resolve_translations(texts, target_language, provider, model, batch_settings, max_workers, on_progress)
+        if previous:
+            # Strings passed through last time stay out of the result like skipped ones
+            translations.update({text: translation for text, translation in reused.items() if translation != text})
+            stats['reused'] = len(reused)
+        if self.job_id:
+            get_job_history().record(
+                self.job_id, language_code(target_language), {text: translations.get(text, text) for text in all_texts}
+            )
+        return translations, stats
+
+    def _resolve_glossary(self, texts, target_language, provider, model, batch_settings, max_workers=None, on_progress=None):
+        # resolve_translations with glossary terms swapped for placeholders
+        glossary_hits = {}
+        protected = {}
+        for text in texts:
+            term = self.glossary.lookup(text, target_language)
+            if term is not None:
+                glossary_hits[text] = term
+            else:
+                protected.setdefault(self.glossary.protect(text, target_language), []).append(text)
+        if on_progress and glossary_hits:
+            on_progress(list(glossary_hits))
+
+        def report(done_texts):
+            on_progress([text for done_text in done_texts for text in protected[done_text]])
+
+        protected_translations, stats = self._resolve_translations(
+            list(protected), target_language, provider, model, batch_settings, max_workers, report if on_progress else None
+        )
+        translations = dict(glossary_hits)
+        for protected_text, translation in protected_translations.items():
+            for text in protected[protected_text]:
+                translations[text] = self.glossary.restore(translation, target_language)
+        stats['glossary_hits'] = len(glossary_hits)
+        return translations, stats
+
+    def _resolve_translations(self, texts, target_language, provider, model, batch_settings, max_workers=None, on_progress=None):
+        # resolve_translations after the previous job and glossary steps
+        texts, skipped = self.cell_filter.split(texts)
+        checkpointed = {}
+        checkpoint_key = f"{self.job_id}:{language_code(target_language)}" if self.job_id else None
+        if checkpoint_key:
+            self.checkpoints = self.checkpoints or get_checkpoint_store()
+            saved = self.checkpoints.load(checkpoint_key)
+            checkpointed = {text: saved[text] for text in texts if text in saved}
+        translations = {}
+        for cache_provider, cache_model in self.cache_keys(provider, model):
+            lookup = [text for text in texts if text not in checkpointed and text not in translations]
+            if not lookup:
+                break
+            translations.update(self.memory.get_many(lookup, "auto", target_language, cache_provider, cache_model))
+        translations.update(checkpointed)
+        missing = [text for text in texts if text not in translations]
+
+        cache_hits = len(translations) - len(checkpointed)
+        if on_progress:
+            on_progress(list(translations) + [text for skipped_texts in skipped.values() for text in skipped_texts])
+
+        # Source languages are detected per batch on the worker threads; strings
+        # found to be in the target language already come back as None
+        pending = {}
+        try:
+            for batch_translations in self.iter_translated_batches(
+                missing, target_language, provider, model, batch_settings, max_workers
+            ):
+                done_texts = list(batch_translations)
+                for text in done_texts:
+                    if batch_translations[text] is None:
+                        skipped.setdefault('target_language', []).append(text)
+                        del batch_translations[text]
+                translations.update(batch_translations)
+                if checkpoint_key:
+                    pending.update(batch_translations)
+                    if len(pending) >= CHECKPOINT_EVERY:
+                        self.checkpoints.save(checkpoint_key, pending)
+                        pending = {}
+                if on_progress:
+                    on_progress(done_texts)
+        finally:
+            # Keep whatever finished, even when a batch failed
+            if pending:
+                self.checkpoints.save(checkpoint_key, pending)
+
+        stats = {
+            'cache_hits': cache_hits,
+            'skipped': {rule: len(skipped_texts) for rule, skipped_texts in skipped.items()}
+        }
+        if checkpointed:
+            stats['resumed'] = len(checkpointed)
+        return translations, stats
+
+    def resolve_languages(self, texts, target_languages, provider, model, batch_settings, max_workers=None, on_progress=None):
+        """
+        resolve_translations for several target languages, run concurrently
+        and sharing the cell filter, detection cache and translation memory.
+        The `max_workers` budget is split between the languages.
+        `on_progress(language, done_texts)` is called from the language threads.
+        Returns {language: (translations, stats)} in the order given.
+        """
+        if len(target_languages) == 1:
+            language = target_languages[0]
+            report = (lambda done_texts: on_progress(language, done_texts)) if on_progress else None
+            return {language: self.resolve_translations(texts, language, provider, model, batch_settings, max_workers, report)}
+
+        workers = max(1, -(-(max_workers or MAX_WORKERS) // len(target_languages)))
+        progress_lock = threading.Lock()
+
+        def run(language):
+            def report(done_texts):
+                with progress_lock:
+                    on_progress(language, done_texts)
+            return self.resolve_translations(
+                texts, language, provider, model, batch_settings, workers, report if on_progress else None
+            )
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=len(target_languages)) as executor:
+            futures = {executor.submit(run, language): language for language in target_languages}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+        return {language: results[language] for language in target_languages}
+
+    def output_filename(self, file_path, language=None, timestamp=None):
+        """
+        Name of a translated file in uploads/, tagged with the language when
+        one job produces several
+        """
+        timestamp = timestamp or int(time.time())
+        name = os.path.basename(file_path)
+        if language:
+            stem, ext = os.path.splitext(name)
+            name = f"{stem}_{language_code(language)}{ext}"
+        return f"translated_{timestamp}_{name}"
+
+    def bundle_outputs(self, file_path, filenames, timestamp):
         """
-        Translate Excel file content while preserving formatting
+        Zip the per-language files of a job into one download and remove them
         """
+        stem = os.path.splitext(os.path.basename(file_path))[0]
+        bundle_name = f"translated_{timestamp}_{stem}.zip"
+        with zipfile.ZipFile(os.path.join("uploads", bundle_name), 'w', zipfile.ZIP_DEFLATED) as bundle:
+            for filename in filenames:
+                path = os.path.join("uploads", filename)
+                bundle.write(path, arcname=filename[len(f"translated_{timestamp}_"):])
+                os.remove(path)
+        return bundle_name
+
+    def translate_excel(self, file_path, target_language, provider="groq", model=None, batch_size=None, token_budget=None, max_workers=None, streaming=None, shared_strings_only=None, processes=None, skip_rules=None, job_id=None, glossary=None, column_context=None, previous_job_id=None, previous_files=None):
+        """
+        Translate Excel file content while preserving formatting.
+        Cells are packed into batched prompts; `batch_size` and `token_budget`
+        override the provider/model defaults from BATCH_SETTINGS. Up to
+        `max_workers` batches are sent concurrently.
+        Files larger than STREAMING_THRESHOLD_BYTES use the streaming path
+        unless `streaming` is set. Smaller xlsx packages are translated in place
+        (see translate_excel_shared_strings), sharded over `processes` worker
+        processes when it is above 1; `shared_strings_only` forces that path.
+        The streaming path always runs in this process.
+        `skip_rules` overrides which cell filter rules mark strings as pass-through.
+        With a `job_id`, completed translations are checkpointed so a failed
+        run can be resumed without translating them again.
+        `glossary` is a term map (dict or JSON, see services/glossary.py) applied
+        to every string. With `column_context` (default COLUMN_CONTEXT) strings
+        are batched per column and the prompt names the column header; this needs
+        cell positions, so it picks the openpyxl or streaming path over shared strings.
+        `target_language` may list several languages (a list or comma separated):
+        the workbook is read and its strings extracted once, every language is
+        translated concurrently and the files come back as one zip.
+        .xls and CSV/TSV files are translated by translate_rows instead.
+        For a new version of an earlier file, `previous_job_id` (a job whose
+        manifest is in the job history) or `previous_files` (the earlier source
+        file and its translated output, single target language only) let
+        unchanged strings reuse their earlier translation; progress reports
+        reused and changed cells.
+        """
+        if skip_rules is not None:
+            self.cell_filter = CellFilter(skip_rules)
+        self.job_id = job_id
+        self.glossary = Glossary.parse(glossary)
+        self.contexts = {}
+        self.previous_job_id = previous_job_id
+        self.previous_files = previous_files
+        self.previous = {}
+        if previous_files and len(target_language_list(target_language)) > 1:
+            # The earlier output is a translation into one language only
+            raise ValueError("A previous file pair can only be reused for a single target language")
+        if column_context is None:
+            column_context = COLUMN_CONTEXT
+
+        # .xls and CSV/TSV go through the row pipeline, xlsx through the paths below
+        backend = get_backend(file_path)
+        if backend.name != 'xlsx':
+            return self.translate_rows(
+                backend, target_language, provider, model, batch_size, token_budget, max_workers, column_context
+            )
+
+        # The shared strings path holds whole xml parts in memory, so large
+        # files stream unless it is asked for explicitly
+        if streaming is None:
+            streaming = os.path.getsize(file_path) >= STREAMING_THRESHOLD_BYTES
+        if shared_strings_only is None:
+            shared_strings_only = shared_strings.is_xlsx_package(file_path) and not column_context and not streaming
+        if shared_strings_only:
+            return self.translate_excel_shared_strings(
+                file_path, target_language, provider, model, batch_size, token_budget, max_workers, processes
+            )
+
+        if streaming:
+            if (processes or SHARD_PROCESSES) > 1:
+                logger.warning(
+                    "%s is streamed in a single process; processes=%s only applies to the shared strings path",
+                    os.path.basename(file_path), processes or SHARD_PROCESSES
+                )
+            return self.translate_excel_streaming(
+                file_path, target_language, provider, model, batch_size, token_budget, max_workers, column_context
+            )
+
+        target_languages = target_language_list(target_language)
+        total_translatable_cells = 0
+        cells_processed = 0
         try:
+            model = model or DEFAULT_MODELS.get(provider)
+            batch_settings = self.get_batch_settings(provider, model, batch_size, token_budget)
+
             # Load workbook
-            wb = openpyxl.load_workbook(file_path)
+            with stage_timer('load_workbook'):
+                wb = openpyxl.load_workbook(file_path)
             
-            # Calculate total cells that need translation
-            total_translatable_cells = 0
-            cells_to_translate = []
+            # Single collection pass: map each unique normalized string to the cells
+            # that use it. Cells are kept by reference, so writing back needs no lookups,
+            # and styles and merged ranges are never touched since only values change.
+            unique_texts = {}
             
-            # First pass: count translatable cells and collect them
             self.update_progress(0, 100, "Analyzing file contents...")
-            for sheet in wb.worksheets:
-                for row in sheet.rows:
-                    for cell in row:
-                        if cell.value and isinstance(cell.value, str) and cell.value.strip():
-                            total_translatable_cells += 1
-                            cells_to_translate.append({
-                                'sheet': sheet,
-                                'coordinate': cell.coordinate,
-                                'text': cell.value,
-                                'style': {
-                                    'font': cell.font.copy(),
-                                    'fill': cell.fill.copy(),
-                                    'border': cell.border.copy(),
-                                    'alignment': cell.alignment.copy(),
-                                    'number_format': cell.number_format
-                                }
-                            })
+            with stage_timer('extract'):
+                for sheet in wb.worksheets:
+                    headers = None
+                    for row in sheet.iter_rows():
+                        # The first row is the header row, the rows below get its labels
+                        row_headers = headers or {}
+                        if column_context and headers is None:
+                            headers = column_headers(sheet.title, [cell.value for cell in row])
+                        for index, cell in enumerate(row):
+                            value = cell.value
+                            if value and isinstance(value, str) and value.strip():
+                                total_translatable_cells += 1
+                                text = normalize_text(value)
+                                unique_texts.setdefault(text, []).append(cell)
+                                if index in row_headers:
+                                    # A string used in several columns keeps the first one
+                                    self.contexts.setdefault(text, row_headers[index])
             
             if total_translatable_cells == 0:
                 self.update_progress(100, 100, "No text to translate!")
                 return None
                 
-            # Initialize progress tracking
-            cells_processed = 0
-            
-            # Process each sheet
-            for sheet_name in wb.sheetnames:
-                sheet = wb[sheet_name]
-                sheet_cells = [c for c in cells_to_translate if c['sheet'] == sheet]
-                
-                if not sheet_cells:
-                    continue
-                    
-                # Get merged cells before unmerging
-                merged_ranges = list(sheet.merged_cells.ranges)
-                
-                # Unmerge cells temporarily
-                for merged_range in merged_ranges:
-                    sheet.unmerge_cells(str(merged_range))
-                
-                # Translate cells in this sheet
-                for idx, cell_info in enumerate(sheet_cells, 1):
-                    try:
-                        # Update progress with detailed message
-                        progress = int((cells_processed / total_translatable_cells) * 100)
-                        self.update_progress(
-                            progress,
-                            100,
-                            f"Translating cell {cells_processed + 1} of {total_translatable_cells} "
-                            f"({progress}%) in sheet '{sheet_name}'"
-                        )
-                        
-                        # Translate the cell content
-                        translated_text = self.translate(
-                            text=cell_info['text'],
-                            source_lang="auto",
-                            target_lang=target_language,
-                            provider=provider,
-                            model=model
-                        )
-                        
-                        # Update cell with translation
-                        cell = sheet[cell_info['coordinate']]
-                        cell.value = translated_text
-                        
-                        # Restore original styling
-                        style = cell_info['style']
-                        cell.font = style['font']
-                        cell.fill = style['fill']
-                        cell.border = style['border']
-                        cell.alignment = style['alignment']
-                        cell.number_format = style['number_format']
-                        
-                        # Increment progress
-                        cells_processed += 1
-                        
-                        # Add a small delay to avoid rate limits
-                        time.sleep(0.1)
-                        
-                    except Exception as e:
-                        raise Exception(f"Error translating cell {cell_info['coordinate']} in sheet '{sheet_name}': {str(e)}")
-                
-                # Reapply merged cells
-                for merged_range in merged_ranges:
-                    sheet.merge_cells(str(merged_range))
-            
-            # Generate output filename with timestamp
+            texts = list(unique_texts)
+            total_unique = len(texts)
+            dedup_stats = {
+                'total_cells': total_translatable_cells,
+                'unique_strings': total_unique,
+                'dedup_ratio': round(1 - total_unique / total_translatable_cells, 4),
+                'api_calls_saved': total_translatable_cells - total_unique
+            }
+            message = f"Found {total_unique} unique strings in {total_translatable_cells} cells"
+            if previous_job_id or previous_files:
+                dedup_stats.update(self.diff_stats(
+                    {text: len(cells) for text, cells in unique_texts.items()}, target_languages
+                ))
+                message += f", {dedup_stats['changed_cells']} changed since the previous version"
+            self.update_progress(0, 100, message, **dedup_stats)
+
+            # Check the translation memory, then translate each remaining unique string once per language
+            strings_processed = 0
+            total_work = total_translatable_cells * len(target_languages)
+
+            def on_progress(language, done_texts):
+                nonlocal strings_processed, cells_processed
+                # Increment progress by every cell the finished strings cover
+                strings_processed += len(done_texts)
+                cells_processed += sum(len(unique_texts[text]) for text in done_texts)
+                progress = int((cells_processed / total_work) * 100)
+                self.update_progress(
+                    progress,
+                    100,
+                    f"Translated {strings_processed} of {total_unique * len(target_languages)} strings ({progress}%)",
+                    **dedup_stats
+                )
+
+            try:
+                with stage_timer('translate'):
+                    results = self.resolve_languages(
+                        texts, target_languages, provider, model, batch_settings, max_workers, on_progress
+                    )
+                dedup_stats.update(language_stats(results))
+            except BatchTranslationError as e:
+                cell = unique_texts[e.text][0]
+                raise Exception(f"Error translating cell {cell.coordinate} in sheet '{cell.parent.title}': {str(e.error)}")
+
+            # Cells skipped for one language may be translated for the next, so
+            # with several languages the original values are restored in between
+            originals = None
+            if len(target_languages) > 1:
+                originals = {text: [cell.value for cell in cells] for text, cells in unique_texts.items()}
+
             timestamp = int(time.time())
-            output_filename = f"translated_{timestamp}_{os.path.basename(file_path)}"
-            output_path = os.path.join("uploads", output_filename)
-            
-            # Save with progress update
+            output_filenames = []
             self.update_progress(95, 100, "Saving translated file...")
-            wb.save(output_path)
+            for language, (translations, _) in results.items():
+                # Write every translation back to all cells that use it; skipped strings stay as they are
+                with stage_timer('write_back'):
+                    for text, cells in unique_texts.items():
+                        translated_text = translations.get(text)
+                        if translated_text is not None:
+                            for cell in cells:
+                                cell.value = translated_text
+                        elif originals is not None:
+                            for cell, value in zip(cells, originals[text]):
+                                cell.value = value
+
+                output_filename = self.output_filename(file_path, language if originals else None, timestamp)
+                with stage_timer('save'):
+                    wb.save(os.path.join("uploads", output_filename))
+                output_filenames.append(output_filename)
+
+            if len(output_filenames) > 1:
+                output_filename = self.bundle_outputs(file_path, output_filenames, timestamp)
             
-            self.update_progress(100, 100, "Translation completed successfully!")
+            self.update_progress(100, 100, "Translation completed successfully!", **dedup_stats)
             return output_filename
             
         except Exception as e:
@@ -203,3 +1140,408 @@ class TranslationService:
                 f"Error: {str(e)}"
             )
             raise Exception(f"Translation failed: {str(e)}")
+
+    def translate_excel_streaming(self, file_path, target_language, provider="groq", model=None, batch_size=None, token_budget=None, max_workers=None, column_context=False):
+        """
+        Translate a large workbook with constant memory: rows are read with a
+        read-only workbook, translated in chunks of STREAMING_CHUNK_ROWS and
+        written to a write-only workbook (one per target language). Values,
+        cell styles and number formats are kept; merged ranges and sheet-level
+        layout are not carried over. With `column_context`, the first row of
+        each sheet labels the strings below it.
+        """
+        target_languages = target_language_list(target_language)
+        totals = {'streaming': True, 'total_cells': 0, 'cache_hits': 0, 'resumed': 0, 'glossary_hits': 0, 'strings_translated': 0, 'skipped': {}}
+        try:
+            model = model or DEFAULT_MODELS.get(provider)
+            batch_settings = self.get_batch_settings(provider, model, batch_size, token_budget)
+
+            self.update_progress(0, 100, "Opening workbook in streaming mode...")
+            with stage_timer('load_workbook'):
+                wb = openpyxl.load_workbook(file_path, read_only=True)
+            output_wbs = {language: openpyxl.Workbook(write_only=True) for language in target_languages}
+
+            # Row counts come from the sheet dimensions, good enough for progress
+            total_rows = sum(sheet.max_row or 0 for sheet in wb.worksheets) or 1
+            rows_processed = 0
+
+            def flush(chunk, output_sheets):
+                nonlocal rows_processed
+                stats = self._translate_row_chunk(chunk, output_sheets, provider, model, batch_settings, max_workers)
+                rows_processed += len(chunk)
+                self.contexts = {}
+                add_chunk_stats(totals, stats)
+                progress = min(int(rows_processed / total_rows * 95), 95)
+                self.update_progress(
+                    progress,
+                    100,
+                    f"Translated {rows_processed} of ~{total_rows} rows in sheet '{sheet.title}' ({progress}%)",
+                    **totals
+                )
+
+            for sheet in wb.worksheets:
+                output_sheets = {language: output_wb.create_sheet(sheet.title) for language, output_wb in output_wbs.items()}
+                chunk = []
+                headers = None
+                for row in sheet.rows:
+                    chunk.append(row)
+                    if column_context and headers is None:
+                        headers = column_headers(sheet.title, [cell.value for cell in row])
+                    elif headers:
+                        for index, cell in enumerate(row):
+                            if index in headers and isinstance(cell.value, str) and cell.value.strip():
+                                self.contexts.setdefault(normalize_text(cell.value), headers[index])
+                    if len(chunk) >= STREAMING_CHUNK_ROWS:
+                        flush(chunk, output_sheets)
+                        chunk = []
+                if chunk:
+                    flush(chunk, output_sheets)
+
+            wb.close()
+
+            timestamp = int(time.time())
+            output_filenames = []
+            self.update_progress(95, 100, "Saving translated file...")
+            for language, output_wb in output_wbs.items():
+                output_filename = self.output_filename(file_path, language if len(output_wbs) > 1 else None, timestamp)
+                with stage_timer('save'):
+                    output_wb.save(os.path.join("uploads", output_filename))
+                output_filenames.append(output_filename)
+
+            if len(output_filenames) > 1:
+                output_filename = self.bundle_outputs(file_path, output_filenames, timestamp)
+
+            self.update_progress(100, 100, "Translation completed successfully!", **totals)
+            return output_filename
+
+        except Exception as e:
+            self.update_progress(0, 100, f"Error: {str(e)}")
+            raise Exception(f"Translation failed: {str(e)}")
+
+    def _translate_row_chunk(self, rows, output_sheets, provider, model, batch_settings, max_workers):
+        """
+        Translate the unique strings of a chunk of read-only rows and append
+        the translated rows to the write-only sheet of every target language
+        (`output_sheets` maps language -> sheet). Stats are summed over languages.
+        """
+        with stage_timer('extract'):
+            cell_counts = Counter(
+                normalize_text(cell.value) for row in rows for cell in row
+                if cell.value and isinstance(cell.value, str) and cell.value.strip()
+            )
+
+        # Only the current chunk's translations are held in memory
+        title = next(iter(output_sheets.values())).title
+        results, stats = self._resolve_chunk(cell_counts, list(output_sheets), provider, model, batch_settings, max_workers, title)
+        for language, (translations, _) in results.items():
+            output_sheet = output_sheets[language]
+            with stage_timer('write_back'):
+                for row in rows:
+                    output_row = []
+                    for cell in row:
+                        value = cell.value
+                        if value is None and not getattr(cell, 'has_style', False):
+                            output_row.append(None)
+                            continue
+                        if isinstance(value, str) and value.strip():
+                            value = translations.get(normalize_text(value), value)
+                        output_cell = WriteOnlyCell(output_sheet, value=value)
+                        if cell.has_style:
+                            output_cell.font = copy(cell.font)
+                            output_cell.fill = copy(cell.fill)
+                            output_cell.border = copy(cell.border)
+                            output_cell.alignment = copy(cell.alignment)
+                            output_cell.number_format = cell.number_format
+                        output_row.append(output_cell)
+                    output_sheet.append(output_row)
+        return stats
+
+    def _resolve_chunk(self, cell_counts, target_languages, provider, model, batch_settings, max_workers, sheet_title):
+        """
+        Translate the unique strings of one chunk (`cell_counts` maps them to
+        their number of cells) for every target language.
+        Returns (resolve_languages results, stats summed over the languages).
+        """
+        texts = list(cell_counts)
+        stats = {'cells': sum(cell_counts.values()), 'cache_hits': 0, 'resumed': 0, 'glossary_hits': 0, 'translated': 0, 'skipped': {}}
+        if self.previous_job_id or self.previous_files:
+            stats['reused'] = 0
+            stats.update(self.diff_stats(cell_counts, target_languages))
+        try:
+            with stage_timer('translate'):
+                results = self.resolve_languages(
+                    texts, target_languages, provider, model, batch_settings, max_workers
+                )
+        except BatchTranslationError as e:
+            raise Exception(f"Error translating '{e.text[:50]}' in sheet '{sheet_title}': {str(e.error)}")
+
+        for translations, language_stats in results.values():
+            skipped = sum(language_stats['skipped'].values())
+            stats['cache_hits'] += language_stats['cache_hits']
+            stats['resumed'] += language_stats.get('resumed', 0)
+            stats['glossary_hits'] += language_stats.get('glossary_hits', 0)
+            if 'reused' in language_stats:
+                stats['reused'] += language_stats['reused']
+            stats['translated'] += (
+                len(texts) - language_stats['cache_hits'] - language_stats.get('resumed', 0)
+                - language_stats.get('glossary_hits', 0) - language_stats.get('reused', 0) - skipped
+            )
+            for rule, count in language_stats['skipped'].items():
+                stats['skipped'][rule] = stats['skipped'].get(rule, 0) + count
+        return results, stats
+
+    def translate_rows(self, backend, target_language, provider="groq", model=None, batch_size=None, token_budget=None, max_workers=None, column_context=False):
+        """
+        Translate a file through a row-based format backend (.xls, CSV/TSV, see
+        services/formats.py) with constant memory: rows are read in chunks of
+        STREAMING_CHUNK_ROWS, their unique strings go through the same filter,
+        memory and batching pipeline as workbooks, and the translated rows are
+        written out per target language as they come.
+        """
+        target_languages = target_language_list(target_language)
+        totals = {'format': backend.name, 'total_cells': 0, 'cache_hits': 0, 'resumed': 0, 'glossary_hits': 0, 'strings_translated': 0, 'skipped': {}}
+        timestamp = int(time.time())
+        output_path = backend.path
+        if backend.output_extension:
+            output_path = os.path.splitext(output_path)[0] + backend.output_extension
+        output_filenames = [
+            self.output_filename(output_path, language if len(target_languages) > 1 else None, timestamp)
+            for language in target_languages
+        ]
+        try:
+            model = model or DEFAULT_MODELS.get(provider)
+            batch_settings = self.get_batch_settings(provider, model, batch_size, token_budget)
+
+            self.update_progress(0, 100, f"Reading {backend.name} file...")
+            writers = {
+                language: backend.open_writer(os.path.join("uploads", filename))
+                for language, filename in zip(target_languages, output_filenames)
+            }
+            rows_processed = 0
+
+            def flush(chunk, title):
+                nonlocal rows_processed
+                with stage_timer('extract'):
+                    cell_counts = Counter(
+                        normalize_text(value) for row in chunk for value in row
+                        if value and isinstance(value, str) and value.strip()
+                    )
+                results, stats = self._resolve_chunk(cell_counts, target_languages, provider, model, batch_settings, max_workers, title)
+                for language, (translations, _) in results.items():
+                    with stage_timer('write_back'):
+                        for row in chunk:
+                            writers[language].append([
+                                translations.get(normalize_text(value), value) if isinstance(value, str) and value.strip() else value
+                                for value in row
+                            ])
+
+                rows_processed += len(chunk)
+                self.contexts = {}
+                add_chunk_stats(totals, stats)
+                progress = min(int(backend.progress() * 95), 95)
+                self.update_progress(
+                    progress,
+                    100,
+                    f"Translated {rows_processed} rows of '{title}' ({progress}%)",
+                    **totals
+                )
+
+            try:
+                for title, rows in backend.sheets():
+                    for writer in writers.values():
+                        writer.add_sheet(title)
+                    chunk = []
+                    headers = None
+                    for row in rows:
+                        chunk.append(row)
+                        if column_context and headers is None:
+                            headers = column_headers(title, row)
+                        elif headers:
+                            for index, value in enumerate(row):
+                                if index in headers and isinstance(value, str) and value.strip():
+                                    self.contexts.setdefault(normalize_text(value), headers[index])
+                        if len(chunk) >= STREAMING_CHUNK_ROWS:
+                            flush(chunk, title)
+                            chunk = []
+                    if chunk:
+                        flush(chunk, title)
+            finally:
+                with stage_timer('save'):
+                    for writer in writers.values():
+                        writer.close()
+
+            if not totals['total_cells']:
+                for filename in output_filenames:
+                    os.remove(os.path.join("uploads", filename))
+                self.update_progress(100, 100, "No text to translate!")
+                return None
+
+            output_filename = output_filenames[0]
+            if len(output_filenames) > 1:
+                output_filename = self.bundle_outputs(output_path, output_filenames, timestamp)
+
+            self.update_progress(100, 100, "Translation completed successfully!", **totals)
+            return output_filename
+
+        except Exception as e:
+            # Drop half-written outputs
+            for filename in output_filenames:
+                path = os.path.join("uploads", filename)
+                if os.path.exists(path):
+                    os.remove(path)
+            self.update_progress(0, 100, f"Error: {str(e)}")
+            raise Exception(f"Translation failed: {str(e)}")
+
+    def translate_excel_shared_strings(self, file_path, target_language, provider="groq", model=None, batch_size=None, token_budget=None, max_workers=None, processes=None):
+        """
+        Translate an xlsx package by rewriting its shared strings table and any
+        inline strings directly. Each shared string entry is translated once and
+        every other part of the package is copied unchanged, so styles, merges
+        and layout are preserved exactly.
+        With `processes` > 1, parts larger than SHARD_MIN_BYTES are split into
+        item/row ranges and extracted and rewritten on a process pool.
+        Strings are extracted once and the package is rewritten per target language.
+        """
+        target_languages = target_language_list(target_language)
+        try:
+            model = model or DEFAULT_MODELS.get(provider)
+            batch_settings = self.get_batch_settings(provider, model, batch_size, token_budget)
+            processes = processes or SHARD_PROCESSES
+
+            self.update_progress(0, 100, "Reading shared strings...")
+            with stage_timer('load_workbook'):
+                with zipfile.ZipFile(file_path) as package:
+                    # Some writers (openpyxl among them) only use inline strings
+                    parts = []
+                    shared_xml = b''
+                    if shared_strings.SHARED_STRINGS_PART in package.namelist():
+                        shared_xml = package.read(shared_strings.SHARED_STRINGS_PART)
+                        parts.append((shared_strings.SHARED_STRINGS_PART, 'si', shared_xml.decode('utf-8')))
+                    for name in shared_strings.inline_string_parts(package):
+                        parts.append((name, 'is', package.read(name).decode('utf-8')))
+
+            # Shard big parts by item/row ranges; small parts stay whole
+            shards = []
+            for name, kind, xml in parts:
+                count = min(processes, len(xml) // SHARD_MIN_BYTES + 1)
+                for chunk in shared_strings.split_at_items(xml, kind, count):
+                    shards.append((name, kind, chunk))
+            del parts
+
+            with stage_timer('extract'):
+                shard_texts = self._run_shards(
+                    shared_strings.extract_shard,
+                    [(chunk, kind) for _, kind, chunk in shards],
+                    processes,
+                    "Extracting strings"
+                )
+            strings = [text for (_, kind, _), found in zip(shards, shard_texts) if kind == 'si' for text in found]
+            inline_count = sum(len(found) for (_, kind, _), found in zip(shards, shard_texts) if kind == 'is')
+            texts = list(dict.fromkeys(
+                normalize_text(text) for found in shard_texts for text in found if text.strip()
+            ))
+            if not texts:
+                self.update_progress(100, 100, "No text to translate!")
+                return None
+
+            # The sst count attribute tells how many cells reference the table
+            total_cells = (shared_strings.reference_count(shared_xml) or len(strings)) + inline_count
+            stats = {
+                'total_cells': total_cells,
+                'unique_strings': len(texts),
+                'dedup_ratio': round(1 - len(texts) / total_cells, 4) if total_cells else 0.0,
+                'api_calls_saved': max(total_cells - len(texts), 0)
+            }
+            if self.previous_job_id or self.previous_files:
+                # Shared string entries count once however many cells use them
+                stats.update(self.diff_stats(
+                    Counter(normalize_text(text) for found in shard_texts for text in found if text.strip()),
+                    target_languages
+                ))
+            strings_processed = 0
+            total_strings = len(texts) * len(target_languages)
+
+            def on_progress(language, done_texts):
+                nonlocal strings_processed
+                strings_processed += len(done_texts)
+                progress = int(strings_processed / total_strings * 95)
+                self.update_progress(
+                    progress,
+                    100,
+                    f"Translated {strings_processed} of {total_strings} strings ({progress}%)",
+                    **stats
+                )
+
+            try:
+                with stage_timer('translate'):
+                    results = self.resolve_languages(
+                        texts, target_languages, provider, model, batch_settings, max_workers, on_progress
+                    )
+                    stats.update(language_stats(results))
+            except BatchTranslationError as e:
+                raise Exception(f"Error translating '{e.text[:50]}': {str(e.error)}")
+
+            timestamp = int(time.time())
+            output_filenames = []
+            self.update_progress(95, 100, "Saving translated file...")
+            for language, (translations, _) in results.items():
+                # Each shard only gets the translations for its own strings
+                with stage_timer('write_back'):
+                    rewritten = self._run_shards(
+                        shared_strings.replace_shard,
+                        [
+                            (chunk, kind, {
+                                text: translations[normalize_text(text)]
+                                for text in found
+                                if text.strip() and normalize_text(text) in translations
+                            })
+                            for (_, kind, chunk), found in zip(shards, shard_texts)
+                        ],
+                        processes,
+                        "Writing strings"
+                    )
+                    replacements = {}
+                    for (name, _, _), chunk in zip(shards, rewritten):
+                        replacements.setdefault(name, []).append(chunk)
+                    replacements = {name: ''.join(chunks).encode('utf-8') for name, chunks in replacements.items()}
+
+                output_filename = self.output_filename(file_path, language if len(results) > 1 else None, timestamp)
+                with stage_timer('save'):
+                    shared_strings.rewrite_package(file_path, os.path.join("uploads", output_filename), replacements)
+                output_filenames.append(output_filename)
+
+            if len(output_filenames) > 1:
+                output_filename = self.bundle_outputs(file_path, output_filenames, timestamp)
+
+            self.update_progress(100, 100, "Translation completed successfully!", **stats)
+            return output_filename
+
+        except Exception as e:
+            self.update_progress(0, 100, f"Error: {str(e)}")
+            raise Exception(f"Translation failed: {str(e)}")
+
+    def _run_shards(self, func, shard_args, processes, label):
+        """
+        Run `func(*args)` for every shard, on a process pool when there is more
+        than one shard, and return the results in shard order. Per-shard
+        completion is reported through the progress callback.
+        """
+        results = [None] * len(shard_args)
+        if processes <= 1 or len(shard_args) <= 1:
+            for idx, args in enumerate(shard_args):
+                results[idx] = func(*args)
+            return results
+
+        # Spawned workers only import services.shared_strings, not this module
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = {executor.submit(func, *args): idx for idx, args in enumerate(shard_args)}
+            for done, future in enumerate(as_completed(futures), 1):
+                results[futures[future]] = future.result()
+                self.update_progress(
+                    0 if label.startswith("Extract") else 95,
+                    100,
+                    f"{label}: shard {done} of {len(shard_args)} done",
+                    shards_done=done,
+                    shards_total=len(shard_args)
+                )
+        return results
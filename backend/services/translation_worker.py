@@ -0,0 +1,180 @@
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+# How often the worker process ships its metrics, router and memory stats
+STATS_INTERVAL_SECONDS = float(os.getenv('WORKER_STATS_INTERVAL', 5))
+
+# How often the web process checks the pipe while no message is waiting
+POLL_SECONDS = 0.05
+
+class TranslationWorkerError(Exception):
+    pass
+
+class TranslationWorker:
+    """
+    Runs translations in a separate, long-lived process so loading, diffing
+    and saving workbooks never competes with the web process, which then
+    only streams files and progress events (and can use greenlets for that).
+    The rate limiters, router stats and translation memory counters live in
+    the worker process and are shared by all jobs; their latest state is
+    sent back periodically for /metrics, /router/stats and /cache/stats.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or int(os.getenv('TRANSLATION_WORKERS', 2))
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.latest = {}
+        self.process = None
+        self.conn = None
+
+    def start(self):
+        context = multiprocessing.get_context('spawn')
+        self.conn, child_conn = context.Pipe()
+        # A patched (gevent) socketpair comes back non-blocking, which the
+        # worker's plain recv loop doesn't expect
+        for connection in (self.conn, child_conn):
+            os.set_blocking(connection.fileno(), True)
+        # Not a daemon: the worker spawns its own shard processes
+        self.process = context.Process(target=_serve, args=(child_conn, self.workers), name="translation-worker")
+        self.process.start()
+        child_conn.close()
+        # Registered after multiprocessing's own exit handler, which joins the
+        # worker, so it runs first and lets the worker exit
+        atexit.register(self.stop)
+        threading.Thread(target=self._read, name="translation-worker-reader", daemon=True).start()
+
+    def stop(self):
+        # The worker exits when its end of the pipe closes
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def run(self, job_id, kwargs, on_event=None):
+        """
+        Translate a file in the worker process with translate_excel(**kwargs)
+        and return its result. Progress events are passed to on_event.
+        """
+        job = {'done': threading.Event(), 'on_event': on_event, 'result': None, 'error': None}
+        with self.lock:
+            self.pending[job_id] = job
+            self.conn.send(('run', job_id, kwargs))
+        job['done'].wait()
+        if job['error'] is not None:
+            raise TranslationWorkerError(job['error'])
+        return job['result']
+
+    def stats(self, name):
+        """
+        Latest 'metrics', 'router' or 'memory' stats sent by the worker, or None
+        """
+        return self.latest.get(name)
+
+    def _read(self):
+        # Polling instead of a blocking recv keeps this loop cooperative
+        # when threads are greenlets
+        conn = self.conn
+        while self.conn is conn:
+            try:
+                if conn.poll(0):
+                    self._dispatch(conn.recv())
+                    continue
+            except (EOFError, OSError):
+                pass
+            else:
+                if self.process.is_alive():
+                    time.sleep(POLL_SECONDS)
+                    continue
+            if self.conn is not conn:
+                return
+            logger.error("Translation worker exited (code %s), restarting it", self.process.exitcode)
+            with self.lock:
+                pending, self.pending = self.pending, {}
+            for job in pending.values():
+                job['error'] = 'The translation worker exited unexpectedly'
+                job['done'].set()
+            self.start()
+            return
+
+    def _dispatch(self, message):
+        kind = message[0]
+        if kind == 'event':
+            _, job_id, data = message
+            job = self.pending.get(job_id)
+            if job and job['on_event']:
+                job['on_event'](data)
+        elif kind == 'done':
+            _, job_id, result, error = message
+            with self.lock:
+                job = self.pending.pop(job_id, None)
+            if job:
+                job['result'], job['error'] = result, error
+                job['done'].set()
+        elif kind == 'stats':
+            self.latest = message[1]
+            metrics.set_remote('worker', self.latest['metrics'])
+
+def _serve(conn, workers):
+    """
+    Worker process main loop: run each requested job on a thread pool
+    and send its progress events and result back over `conn`
+    """
+    from services.provider_router import get_router
+    from services.translation_memory import get_translation_memory
+    from services.translation_service import TranslationService
+
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s] [translation-worker] [%(levelname)s] %(message)s")
+    send_lock = threading.Lock()
+
+    def send(message):
+        with send_lock:
+            conn.send(message)
+
+    def send_stats():
+        send(('stats', {
+            'metrics': metrics.export(),
+            'router': get_router().snapshot(),
+            'memory': get_translation_memory().stats()
+        }))
+
+    def report_stats():
+        while True:
+            time.sleep(STATS_INTERVAL_SECONDS)
+            try:
+                send_stats()
+            except Exception:
+                logger.exception("Sending worker stats failed")
+
+    def run(job_id, kwargs):
+        result = error = None
+        try:
+            service = TranslationService()
+            service.set_progress_callback(lambda data: send(('event', job_id, data)))
+            result = service.translate_excel(**kwargs)
+        except Exception as e:
+            logger.exception("Translation %s failed", job_id)
+            error = str(e)
+        # Stats first, so they already include this job when it is reported done
+        try:
+            send_stats()
+        except Exception:
+            logger.exception("Sending worker stats failed")
+        send(('done', job_id, result, error))
+
+    threading.Thread(target=report_stats, name="worker-stats", daemon=True).start()
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="translation")
+    while True:
+        try:
+            _, job_id, kwargs = conn.recv()
+        except (EOFError, OSError):
+            # The web process is gone; interrupted jobs are requeued on its next start
+            os._exit(0)
+        executor.submit(run, job_id, kwargs)
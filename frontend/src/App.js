@@ -86,7 +86,7 @@ const FileUploadZone = ({ onFileSelect, isDragging, setIsDragging }) => {
     e.preventDefault();
     setIsDragging(false);
     const droppedFile = e.dataTransfer.files[0];
-    if (droppedFile && (droppedFile.name.endsWith('.xlsx') || droppedFile.name.endsWith('.xls'))) {
+    if (droppedFile && /\.(xlsx|xls|csv|tsv)$/i.test(droppedFile.name)) {
       onFileSelect(droppedFile);
     }
   };
@@ -114,7 +114,7 @@ const FileUploadZone = ({ onFileSelect, isDragging, setIsDragging }) => {
     >
       <input
         type="file"
-        accept=".xlsx,.xls"
+        accept=".xlsx,.xls,.csv,.tsv"
         onChange={handleFileInput}
         className="absolute inset-0 w-full h-full opacity-0 cursor-pointer"
       />
@@ -141,7 +141,7 @@ const FileUploadZone = ({ onFileSelect, isDragging, setIsDragging }) => {
             Drag and drop your Excel file here, or{' '}
             <span className="text-purple-600 font-medium">browse</span>
           </p>
-          <p className="text-sm text-gray-500 mt-1">Supports .xlsx and .xls files</p>
+          <p className="text-sm text-gray-500 mt-1">Supports .xlsx, .xls, .csv and .tsv files</p>
         </div>
       </div>
     </div>